@@ -3,11 +3,30 @@ FastAPI service for Churn Prediction Model
 Deployed on Snowpark Container Services (SPCS)
 """
 
-from fastapi import FastAPI, HTTPException, Request
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from fastapi import Body, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator, Iterator, IO
+import asyncio
+import csv
+import hmac
+import json
 import logging
-from churn_predictor import predict_churn_handler, predict_batch_handler, get_model
+import os
+import tempfile
+import numpy as np
+from churn_predictor import predict_batch_handler, predict_columns_handler, triage_columns_handler, get_model
+from model_registry import get_model_registry
+from inference_pool import InferencePool, PoolSaturatedError
+from lane_scheduler import LaneScheduler
+from micro_batcher import MicroBatcher
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from warmup import Warmup
+from metrics import REGISTRY, CONTENT_TYPE, STAGE_SECONDS, REQUEST_BATCH_SIZE, Gauge, MetricsMiddleware
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,6 +36,60 @@ app = FastAPI(
     description="ML-powered customer churn prediction for telecom customer retention",
     version="2.0.0"
 )
+app.add_middleware(MetricsMiddleware)
+
+# Model inference runs off the event loop on a bounded worker pool
+inference_pool = InferencePool.from_env()
+
+# Interactive, warehouse and bulk work reach the pool through priority lanes
+scheduler = LaneScheduler.from_env(inference_pool)
+
+
+async def _score_micro_batch(customers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Score a coalesced batch of single-customer requests in the interactive lane."""
+    return await scheduler.run("interactive", predict_batch_handler, customers)
+
+
+# Concurrent single-customer requests are scored together as one matrix
+micro_batcher = MicroBatcher.from_env(_score_micro_batch)
+
+# Queue depth, read at scrape time; sustained pending near max_pending means saturation
+REGISTRY.register(Gauge(
+    "churn_inference_pool_pending",
+    "Scoring jobs running or queued on the inference pool.",
+    lambda: inference_pool.pending
+))
+REGISTRY.register(Gauge(
+    "churn_inference_pool_max_pending",
+    "Inference pool admission limit; also the default queue limit of each priority lane.",
+    lambda: inference_pool.max_pending
+))
+REGISTRY.register(Gauge(
+    "churn_micro_batch_pending",
+    "Single-customer requests waiting for the next micro-batch.",
+    lambda: micro_batcher.stats()["pending"]
+))
+
+
+async def predict_single(features: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Serve one customer from the prediction cache, or via the micro-batcher.
+    
+    With the process executor the cache lives in the worker processes, so
+    the probe is skipped and the workers' predict_batch serves hits.
+    """
+    if inference_pool.mode != "process":
+        cached = get_model().predict_cached(features)
+        if cached is not None:
+            return cached
+    return await micro_batcher.submit(features)
+
+# Rows scored per chunk by the streaming bulk endpoint
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", "1000"))
+# Uploads larger than this are spooled to disk rather than memory
+STREAM_SPOOL_MAX_BYTES = int(os.environ.get("STREAM_SPOOL_MAX_BYTES", str(16 * 1024 * 1024)))
+# Validate /predict/batch column-wise and encode its response directly, skipping per-item Pydantic models
+BATCH_FAST_PATH = os.environ.get("BATCH_FAST_PATH", "1").lower() in ("1", "true", "yes")
 
 # Field names in order for Snowflake service function calls
 SNOWFLAKE_FIELD_ORDER = [
@@ -92,6 +165,9 @@ class PredictionResponse(BaseModel):
     confidence_score: float
     days_until_likely_churn: int
     prediction_timestamp: str
+    feature_contributions: Optional[Dict[str, float]] = Field(
+        None, description="Model contributions per feature to the churn log-odds (CHURN_FEATURE_CONTRIBUTIONS=1)"
+    )
 
 
 class BatchPredictionRequest(BaseModel):
@@ -108,6 +184,27 @@ class BatchPredictionResponse(BaseModel):
     low_risk_count: int
 
 
+class TriagePrediction(BaseModel):
+    """Triage-grade prediction: risk category with as few boosting stages as needed."""
+    customer_id: str
+    churn_risk_category: str = Field(..., description="Risk category: High, Medium, or Low")
+    churn_probability: Optional[float] = Field(
+        None, description="Probability of churn; null when scoring stopped before the last stage"
+    )
+    stages_used: int = Field(..., description="Boosting stages evaluated for this customer")
+
+
+class TriageResponse(BaseModel):
+    """Response schema for triage predictions."""
+    predictions: List[TriagePrediction]
+    total_processed: int
+    high_risk_count: int
+    medium_risk_count: int
+    low_risk_count: int
+    total_stages: int = Field(..., description="Boosting stages in the model")
+    avg_stages_used: float = Field(..., description="Mean stages evaluated per customer")
+
+
 class HealthResponse(BaseModel):
     """Health check response."""
     status: str
@@ -115,42 +212,302 @@ class HealthResponse(BaseModel):
     model_version: str
 
 
-def parse_snowflake_request(data: List[List]) -> List[Dict]:
+class ModelActivateRequest(BaseModel):
+    """Request schema for switching the live model version."""
+    version: str = Field(..., description="Registry version to serve")
+
+
+class ShadowRequest(BaseModel):
+    """Request schema for shadow scoring a candidate model version."""
+    version: Optional[str] = Field(None, description="Registry version to shadow; null stops shadow scoring")
+    sample_pct: Optional[float] = Field(None, ge=0, le=100, description="Percentage of scored rows to shadow")
+
+
+# JSON value types the fast path accepts unchanged for each CustomerFeatures field type
+# (bool is excluded on purpose; anything else is left to Pydantic)
+FAST_PATH_TYPES = {float: {int, float}, int: {int}, str: {str}}
+
+
+def _customer_field_specs() -> List[Tuple[str, type, bool, Any, Optional[float], Optional[float]]]:
+    """(name, type, required, default, ge, le) of every CustomerFeatures field."""
+    specs = []
+    for name, field in CustomerFeatures.model_fields.items():
+        ge = next((m.ge for m in field.metadata if hasattr(m, "ge")), None)
+        le = next((m.le for m in field.metadata if hasattr(m, "le")), None)
+        required = field.is_required()
+        specs.append((name, field.annotation, required, None if required else field.default, ge, le))
+    return specs
+
+
+CUSTOMER_FIELD_SPECS = _customer_field_specs()
+
+# /predict/batch reads its body untyped; document it as BatchPredictionRequest
+BATCH_REQUEST_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {
+                    "title": "BatchPredictionRequest",
+                    "type": "object",
+                    "required": ["customers"],
+                    "properties": {
+                        "customers": {"title": "Customers", "type": "array", "items": CustomerFeatures.model_json_schema()}
+                    }
+                }
+            }
+        }
+    }
+}
+
+
+def decode_batch_columns(payload: Any) -> Optional[Dict[str, Any]]:
     """
-    Parse Snowflake service function format into feature dictionaries.
+    Validate a /predict/batch body in bulk and return it as feature columns.
     
-    Snowflake sends: {"data": [[row_idx, param1, param2, ...], ...]}
+    Types and ge/le bounds are checked one column at a time, with NumPy for
+    the ranges, instead of building a CustomerFeatures per customer. Only
+    values Pydantic would accept unchanged are handled: JSON numbers for
+    float fields, integers for int fields and strings for str fields.
+    Anything else (missing customer_id, wrong types, numeric strings,
+    out-of-range or non-finite numbers) returns None, and the caller falls
+    back to validate_batch_request so the batch is accepted or rejected
+    exactly as before.
     """
-    results = []
-    for row in data:
-        # First element is the row index from Snowflake
-        row_idx = row[0]
-        values = row[1:]  # Actual parameter values
-        
-        # Map values to field names
-        features = {}
-        for i, field_name in enumerate(SNOWFLAKE_FIELD_ORDER):
-            if i < len(values):
-                features[field_name] = values[i]
+    if type(payload) is not dict:
+        return None
+    customers = payload.get("customers")
+    if type(customers) is not list or any(type(customer) is not dict for customer in customers):
+        return None
+    
+    columns = {}
+    for name, annotation, required, default, ge, le in CUSTOMER_FIELD_SPECS:
+        if required:
+            values = [customer.get(name) for customer in customers]
+        else:
+            values = [customer.get(name, default) for customer in customers]
+        if not set(map(type, values)) <= FAST_PATH_TYPES[annotation]:
+            return None
+        if annotation is str:
+            columns[name] = values
+            continue
         
-        features['_row_idx'] = row_idx  # Keep row index for response
-        results.append(features)
+        try:
+            array = np.array(values, dtype=np.float64)
+        except OverflowError:
+            return None
+        if not np.isfinite(array).all():
+            return None
+        if ge is not None and not (array >= ge).all():
+            return None
+        if le is not None and not (array <= le).all():
+            return None
+        columns[name] = array
+    return columns
+
+
+def validate_batch_request(payload: Any) -> List[Dict[str, Any]]:
+    """
+    Validate a /predict/batch body with BatchPredictionRequest.
     
-    return results
+    Raises:
+        RequestValidationError: With the same errors FastAPI reports for an
+            invalid BatchPredictionRequest body (422)
+    """
+    try:
+        request = BatchPredictionRequest.model_validate(payload, from_attributes=True)
+    except ValidationError as e:
+        errors = [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        raise RequestValidationError(errors, body=payload)
+    return [c.model_dump() for c in request.customers]
+
 
+def encode_batch_response(results: List[Dict[str, Any]]) -> bytes:
+    """Serialise batch results straight to BatchPredictionResponse JSON."""
+    risk_counts = {"High": 0, "Medium": 0, "Low": 0}
+    for result in results:
+        risk_counts[result["churn_risk_category"]] += 1
+    
+    response = {
+        "predictions": results,
+        "total_processed": len(results),
+        "high_risk_count": risk_counts["High"],
+        "medium_risk_count": risk_counts["Medium"],
+        "low_risk_count": risk_counts["Low"]
+    }
+    if orjson is not None:
+        return orjson.dumps(response)
+    return json.dumps(response, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_triage_response(customer_ids: List[Any], results: Dict[str, Any]) -> bytes:
+    """Serialise triage result arrays straight to TriageResponse JSON."""
+    risk_categories = results["churn_risk_category"].tolist()
+    stages_used = results["stages_used"]
+    probabilities = [None if p != p else p for p in np.round(results["churn_probability"], 4).tolist()]
+    predictions = [
+        {"customer_id": customer_id, "churn_risk_category": risk, "churn_probability": probability, "stages_used": stages}
+        for customer_id, risk, probability, stages in zip(customer_ids, risk_categories, probabilities, stages_used.tolist())
+    ]
+    response = {
+        "predictions": predictions,
+        "total_processed": len(predictions),
+        "high_risk_count": risk_categories.count("High"),
+        "medium_risk_count": risk_categories.count("Medium"),
+        "low_risk_count": risk_categories.count("Low"),
+        "total_stages": int(results["total_stages"]),
+        "avg_stages_used": round(float(stages_used.mean()), 2) if len(predictions) else 0.0
+    }
+    if orjson is not None:
+        return orjson.dumps(response)
+    return json.dumps(response, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
 
-def format_snowflake_response(results: List[Dict]) -> Dict:
+
+def decode_snowflake_request(data: List[List]) -> Tuple[List[Any], Dict[str, List[Any]]]:
+    """
+    Decode Snowflake service function rows into row indices and feature columns.
+    
+    Snowflake sends: {"data": [[row_idx, param1, param2, ...], ...]}
+    
+    The positional rows are transposed in one pass into one column per entry of
+    SNOWFLAKE_FIELD_ORDER. Short rows are padded with None, which the model
+    treats as "use the default value".
+    """
+    width = len(SNOWFLAKE_FIELD_ORDER) + 1
+    padded = (row if len(row) >= width else list(row) + [None] * (width - len(row)) for row in data)
+    columns = [list(column) for column in zip(*padded)]
+    if not columns:
+        return [], {}
+    
+    # First column is the row index from Snowflake
+    row_indices = columns[0]
+    features = dict(zip(SNOWFLAKE_FIELD_ORDER, columns[1:width]))
+    return row_indices, features
+
+
+def format_snowflake_response(row_indices: List[Any], results: List[Dict]) -> Dict:
     """
     Format response for Snowflake service function.
     
     Snowflake expects: {"data": [[row_idx, result], ...]}
     """
-    data = []
-    for result in results:
-        row_idx = result.pop('_row_idx', 0)
-        data.append([row_idx, result])
+    return {"data": [[row_idx, result] for row_idx, result in zip(row_indices, results)]}
+
+
+def require_model_registry(request: Request):
+    """
+    Return the model registry for an /admin request.
     
-    return {"data": data}
+    Raises:
+        HTTPException: 403 if CHURN_ADMIN_TOKEN is set and the X-Admin-Token
+            header does not match, 404 if no registry is configured
+    """
+    token = os.environ.get("CHURN_ADMIN_TOKEN")
+    if token and not hmac.compare_digest(request.headers.get("x-admin-token", ""), token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    registry = get_model_registry()
+    if registry is None:
+        raise HTTPException(status_code=404, detail="Model registry not configured (set CHURN_MODEL_REGISTRY)")
+    return registry
+
+
+def saturated_exception(error: PoolSaturatedError) -> HTTPException:
+    """Build the 503 returned when the inference pool is saturated or a lane rejects the request."""
+    logger.warning(str(error))
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+async def spool_body(request: Request) -> IO[bytes]:
+    """
+    Copy the request body into a spooled temporary file as it arrives.
+    
+    Bodies larger than STREAM_SPOOL_MAX_BYTES roll over to disk, so a bulk
+    upload never has to fit in memory. Reading the whole upload before
+    responding also avoids deadlocking clients that only start reading the
+    response once their upload has finished.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_MAX_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def iter_body_records(body: IO[bytes], is_csv: bool) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield (line_number, record) pairs from an NDJSON or CSV body, one line at a time.
+    
+    CSV bodies start with a header row of CustomerFeatures field names; empty
+    cells are treated as missing. Unparseable lines yield the exception.
+    """
+    header = None
+    for line_number, raw_line in enumerate(body, start=1):
+        line = raw_line.strip()
+        if not line:
+            continue
+        try:
+            line = line.decode("utf-8")
+            if not is_csv:
+                yield line_number, json.loads(line)
+            elif header is None:
+                header = next(csv.reader([line]))
+            else:
+                values = next(csv.reader([line]))
+                yield line_number, {name: value for name, value in zip(header, values) if value != ""}
+        except (ValueError, csv.Error) as e:
+            yield line_number, e
+
+
+async def score_chunk(customers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Score one streaming chunk, waiting out pool saturation instead of failing the stream."""
+    while True:
+        try:
+            return await scheduler.run("bulk", predict_batch_handler, customers)
+        except PoolSaturatedError as e:
+            await asyncio.sleep(e.retry_after)
+
+
+# Start-up warm-up; /ready reports its state
+warmup = Warmup.from_env()
+
+
+async def _warm_batch(customers: List[Dict[str, Any]]):
+    """Warm-up path mirroring /predict/batch (fast path)."""
+    columns = decode_batch_columns({"customers": customers})
+    results = await scheduler.run("bulk", predict_columns_handler, columns)
+    encode_batch_response(results)
+
+
+async def _warm_snowflake(customers: List[Dict[str, Any]]):
+    """Warm-up path mirroring a multi-row Snowflake /predict call."""
+    rows = [[i] + [customer.get(name) for name in SNOWFLAKE_FIELD_ORDER] for i, customer in enumerate(customers)]
+    row_indices, columns = decode_snowflake_request(rows)
+    results = await scheduler.run("warehouse", predict_columns_handler, columns)
+    JSONResponse(format_snowflake_response(row_indices, results))
+
+
+async def _warm_single(customers: List[Dict[str, Any]]):
+    """Warm-up path for single-customer requests (cache probe and micro-batcher)."""
+    await predict_single(customers[0])
+
+
+def _reset_prediction_cache():
+    """Drop warm-up predictions and counters from the prediction cache."""
+    cache = get_model().cache
+    if cache is not None:
+        cache.clear(reset_stats=True)
+
+
+WARMUP_PATHS = {
+    "single": (_warm_single, 1),
+    "batch": (_warm_batch, None),
+    "snowflake": (_warm_snowflake, None),
+    "stream": (score_chunk, None)
+}
 
 
 @app.on_event("startup")
@@ -158,7 +515,20 @@ async def startup_event():
     """Initialize model on startup."""
     logger.info("Starting Churn Prediction API...")
     get_model()
+    registry = get_model_registry()
+    if registry is not None:
+        registry.start_watcher()
     logger.info("Model initialized successfully")
+    warmup.start(WARMUP_PATHS, on_ready=_reset_prediction_cache)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Drain the inference pool on shutdown."""
+    registry = get_model_registry()
+    if registry is not None:
+        registry.stop_watcher()
+    inference_pool.shutdown()
 
 
 @app.get("/health", response_model=HealthResponse)
@@ -168,7 +538,7 @@ async def health_check():
         model = get_model()
         return HealthResponse(
             status="healthy",
-            model_loaded=model.model is not None,
+            model_loaded=model.is_loaded,
             model_version=model.model_version
         )
     except Exception as e:
@@ -180,6 +550,20 @@ async def health_check():
         )
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 once the start-up warm-up has settled, 503 before.
+
+    Unlike /health (liveness), this stays 503 while the warm-up is running,
+    so new replicas only receive traffic once their latency is stable.
+    """
+    stats = warmup.stats()
+    if not warmup.ready:
+        return JSONResponse(stats, status_code=503)
+    return stats
+
+
 @app.post("/predict")
 async def predict_churn(request: Request):
     """
@@ -190,67 +574,289 @@ async def predict_churn(request: Request):
     - Snowflake service function format: {"data": [[row_idx, ...], ...]}
     """
     try:
-        body = await request.json()
+        with STAGE_SECONDS.time(stage="parse"):
+            body = await request.json()
+            is_snowflake = "data" in body and isinstance(body["data"], list)
+            if is_snowflake:
+                # Decode positional rows into columns and score them in one pass
+                row_indices, columns = decode_snowflake_request(body["data"])
+            else:
+                features = CustomerFeatures(**body)
         
         # Check if this is Snowflake format (has "data" array)
-        if "data" in body and isinstance(body["data"], list):
+        if is_snowflake:
             logger.info(f"Received Snowflake format request with {len(body['data'])} rows")
+            REQUEST_BATCH_SIZE.observe(len(row_indices), endpoint="snowflake")
             
-            # Parse Snowflake format
-            customers = parse_snowflake_request(body["data"])
-            
-            # Process each row
-            results = []
-            for features in customers:
-                row_idx = features.pop('_row_idx', 0)
-                result = predict_churn_handler(features)
-                result['_row_idx'] = row_idx
-                results.append(result)
+            if len(row_indices) == 1:
+                # Single-row calls (e.g. GET_CHURN_PREDICTION) join a micro-batch
+                features = {name: values[0] for name, values in columns.items() if values[0] is not None}
+                results = [await predict_single(features)]
+            else:
+                results = await scheduler.run("warehouse", predict_columns_handler, columns)
             
             # Return in Snowflake format
-            return format_snowflake_response(results)
+            with STAGE_SECONDS.time(stage="serialize"):
+                return JSONResponse(format_snowflake_response(row_indices, results))
         
         else:
             # Direct JSON format (for local testing)
             logger.info("Received direct JSON format request")
-            features = CustomerFeatures(**body)
-            result = predict_churn_handler(features.model_dump())
-            return PredictionResponse(**result)
+            REQUEST_BATCH_SIZE.observe(1, endpoint="predict")
+            result = await predict_single(features.model_dump())
+            with STAGE_SECONDS.time(stage="serialize"):
+                return JSONResponse(PredictionResponse(**result).model_dump(mode="json", exclude_none=True))
             
+    except PoolSaturatedError as e:
+        raise saturated_exception(e)
     except Exception as e:
         logger.error(f"Prediction error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/predict/batch", response_model=BatchPredictionResponse)
-async def predict_churn_batch(request: BatchPredictionRequest):
+@app.post("/predict/batch", response_model=BatchPredictionResponse, response_model_exclude_none=True,
+          openapi_extra=BATCH_REQUEST_OPENAPI)
+async def predict_churn_batch(payload: Any = Body(...)):
     """
     Predict churn probability for multiple customers.
     
     Returns predictions for all customers along with summary statistics.
+    
+    With BATCH_FAST_PATH enabled (the default) well-formed batches are
+    validated column-wise and their response is encoded directly; other
+    bodies go through BatchPredictionRequest and get the same 422 errors.
     """
+    with STAGE_SECONDS.time(stage="parse"):
+        columns = decode_batch_columns(payload) if BATCH_FAST_PATH else None
+        if columns is None:
+            customers_data = validate_batch_request(payload)
+    
     try:
-        customers_data = [c.model_dump() for c in request.customers]
-        results = predict_batch_handler(customers_data)
+        if columns is not None:
+            REQUEST_BATCH_SIZE.observe(len(columns["customer_id"]), endpoint="batch")
+            results = await scheduler.run("bulk", predict_columns_handler, columns)
+            with STAGE_SECONDS.time(stage="serialize"):
+                return Response(content=encode_batch_response(results), media_type="application/json")
         
-        predictions = [PredictionResponse(**r) for r in results]
+        REQUEST_BATCH_SIZE.observe(len(customers_data), endpoint="batch")
+        results = await scheduler.run("bulk", predict_batch_handler, customers_data)
         
-        high_risk = sum(1 for p in predictions if p.churn_risk_category == "High")
-        medium_risk = sum(1 for p in predictions if p.churn_risk_category == "Medium")
-        low_risk = sum(1 for p in predictions if p.churn_risk_category == "Low")
-        
-        return BatchPredictionResponse(
-            predictions=predictions,
-            total_processed=len(predictions),
-            high_risk_count=high_risk,
-            medium_risk_count=medium_risk,
-            low_risk_count=low_risk
-        )
+        with STAGE_SECONDS.time(stage="serialize"):
+            predictions = [PredictionResponse(**r) for r in results]
+            
+            high_risk = sum(1 for p in predictions if p.churn_risk_category == "High")
+            medium_risk = sum(1 for p in predictions if p.churn_risk_category == "Medium")
+            low_risk = sum(1 for p in predictions if p.churn_risk_category == "Low")
+            
+            return BatchPredictionResponse(
+                predictions=predictions,
+                total_processed=len(predictions),
+                high_risk_count=high_risk,
+                medium_risk_count=medium_risk,
+                low_risk_count=low_risk
+            )
+    except PoolSaturatedError as e:
+        raise saturated_exception(e)
     except Exception as e:
         logger.error(f"Batch prediction error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/predict/triage", response_model=TriageResponse, openapi_extra=BATCH_REQUEST_OPENAPI)
+async def predict_churn_triage(payload: Any = Body(...)):
+    """
+    Triage-grade risk categories for bulk segmentation.
+    
+    Takes the same body as /predict/batch. Boosting stages are evaluated in
+    order and each customer stops once no remaining stage can move it
+    across a risk threshold, so categories match /predict/batch while
+    clearly Low or High customers cost only part of the ensemble. Each
+    prediction reports its stages_used; churn_probability is null for
+    customers that stopped early. No churn factors, actions or
+    days-until-churn are returned.
+    """
+    with STAGE_SECONDS.time(stage="parse"):
+        columns = decode_batch_columns(payload)
+        if columns is None:
+            customers_data = validate_batch_request(payload)
+            columns = {name: [customer[name] for customer in customers_data] for name in CustomerFeatures.model_fields}
+    
+    try:
+        REQUEST_BATCH_SIZE.observe(len(columns["customer_id"]), endpoint="triage")
+        results = await scheduler.run("bulk", triage_columns_handler, columns)
+        with STAGE_SECONDS.time(stage="serialize"):
+            return Response(content=encode_triage_response(columns["customer_id"], results),
+                            media_type="application/json")
+    except PoolSaturatedError as e:
+        raise saturated_exception(e)
+    except Exception as e:
+        logger.error(f"Triage prediction error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/predict/stream")
+async def predict_churn_stream(request: Request):
+    """
+    Stream churn predictions for a bulk NDJSON or CSV upload.
+    
+    The upload (one JSON object per line, or CSV with a header row when
+    Content-Type is text/csv) is spooled to a temporary file, then read back
+    line by line, scored in chunks of STREAM_CHUNK_SIZE and streamed back as
+    NDJSON as each chunk completes.
+    Invalid rows produce an {"line": n, "error": ...} line. The final line
+    is {"summary": {...}} with running risk-category totals, so memory use
+    stays constant regardless of input size.
+    """
+    is_csv = "csv" in request.headers.get("content-type", "")
+    body = await spool_body(request)
+    
+    async def generate() -> AsyncIterator[bytes]:
+        totals = {"total_processed": 0, "high_risk_count": 0, "medium_risk_count": 0,
+                  "low_risk_count": 0, "error_count": 0}
+        chunk: List[Dict[str, Any]] = []
+        
+        async def flush() -> bytes:
+            REQUEST_BATCH_SIZE.observe(len(chunk), endpoint="stream")
+            results = await score_chunk(chunk)
+            with STAGE_SECONDS.time(stage="serialize"):
+                lines = []
+                for result in results:
+                    totals["total_processed"] += 1
+                    totals[f"{result['churn_risk_category'].lower()}_risk_count"] += 1
+                    lines.append(json.dumps(result))
+                chunk.clear()
+                return ("\n".join(lines) + "\n").encode("utf-8")
+        
+        try:
+            for line_number, record in iter_body_records(body, is_csv):
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    chunk.append(CustomerFeatures(**record).model_dump())
+                except (ValueError, TypeError, ValidationError) as e:
+                    totals["error_count"] += 1
+                    yield (json.dumps({"line": line_number, "error": str(e)}) + "\n").encode("utf-8")
+                    continue
+                
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    yield await flush()
+            
+            if chunk:
+                yield await flush()
+            logger.info(f"Streamed {totals['total_processed']} predictions ({totals['error_count']} errors)")
+        finally:
+            # Spooled uploads may be disk-backed; release them on errors and disconnects too
+            body.close()
+        yield (json.dumps({"summary": totals}) + "\n").encode("utf-8")
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.post("/predict/arrow")
+async def predict_churn_arrow(request: Request):
+    """
+    Score an Apache Arrow IPC stream of customer features.
+    
+    The body is an Arrow record batch stream with SNOWFLAKE_FIELD_ORDER
+    columns; the response is an Arrow stream of per-customer probabilities,
+    risk categories, confidence and days-to-churn (see arrow_io).
+    """
+    try:
+        from arrow_io import ARROW_STREAM_MEDIA_TYPE, score_arrow_stream
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Arrow support requires pyarrow")
+    
+    try:
+        body = await request.body()
+        result = await scheduler.run("bulk", score_arrow_stream, body)
+        return Response(content=result, media_type=ARROW_STREAM_MEDIA_TYPE)
+    except PoolSaturatedError as e:
+        raise saturated_exception(e)
+    except Exception as e:
+        logger.error(f"Arrow prediction error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Prediction cache size and hit/miss counters.
+    
+    Counters are those of this process; with INFERENCE_EXECUTOR=process each
+    worker process keeps its own cache.
+    """
+    model = get_model()
+    if model.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "model_version": model.model_version, **model.cache.stats()}
+
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """
+    Priority lane configuration, load and counters for this process.
+    
+    Per lane: queued slices, requests in progress, completed requests,
+    rejections by reason and p50/p99 request latency over the last 1000
+    requests.
+    """
+    return scheduler.stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text-format metrics for this process.
+    
+    Per-stage latency histograms, request and model batch sizes, risk
+    category counters, inference pool queue depth and rejections, and
+    per-lane latency and rejections.
+    """
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/admin/models")
+async def list_models(request: Request):
+    """Registry versions, the live version of this process and shadow scoring results."""
+    return require_model_registry(request).stats()
+
+
+@app.post("/admin/models/activate")
+async def activate_model(body: ModelActivateRequest, request: Request):
+    """
+    Switch the live model to a registry version without dropping requests.
+    
+    The version is loaded and warmed off the event loop, then swapped in;
+    CURRENT is updated so the other workers follow within
+    CHURN_REGISTRY_POLL_SECS.
+    """
+    registry = require_model_registry(request)
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, registry.activate, body.version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except Exception as e:
+        logger.error(f"Model activation failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return registry.stats()
+
+
+@app.post("/admin/models/shadow")
+async def shadow_model(body: ShadowRequest, request: Request):
+    """Shadow score a candidate version on a sample of live traffic, or stop with version=null."""
+    registry = require_model_registry(request)
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, registry.set_shadow, body.version, body.sample_pct)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except Exception as e:
+        logger.error(f"Shadow configuration failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return registry.stats()
+
+
 @app.get("/model/info")
 async def model_info():
     """Get model information and feature requirements."""
@@ -0,0 +1,174 @@
+"""
+Apache Arrow columnar input/output for churn scoring
+
+Feature extracts exported from Snowflake as Arrow/Parquet can be scored
+without a JSON round trip: a record batch stream whose columns are the
+SNOWFLAKE_FIELD_ORDER fields (any letter case) is converted column by
+column into the model's raw feature matrix, scored in one pass and
+returned as an Arrow stream of customer_id, churn_probability,
+churn_risk_category, confidence_score and days_until_likely_churn.
+
+Feature files on disk (Parquet or CSV) can be streamed as record batches
+with iter_record_batches; train_model.py and batch_score.py build on it.
+
+Requires pyarrow, which is imported lazily so the rest of the service
+does not depend on it.
+
+Client usage:
+    import pyarrow.parquet as pq
+    from arrow_io import score_table
+    predictions = score_table("http://localhost:8000/predict/arrow", pq.read_table("features.parquet"))
+"""
+
+import glob
+import logging
+import os
+import urllib.request
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+from churn_predictor import FEATURE_INPUTS, get_model
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+INPUT_EXTENSIONS = (".parquet", ".csv", ".csv.gz")
+
+# Numeric feature columns (lower case)
+NUMERIC_COLUMNS = {name for name, _, _, _ in FEATURE_INPUTS if name != "customer_segment"}
+
+# Rough CSV row size, used to size read blocks to about chunk_rows rows
+CSV_BYTES_PER_ROW = 160
+
+
+def find_input_files(patterns: List[str]) -> List[str]:
+    """Expand files, glob patterns and directories into a sorted list of input files."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            matches = glob.glob(pattern)
+        paths.extend(path for path in matches if path.lower().endswith(INPUT_EXTENSIONS))
+    return sorted(set(paths))
+
+
+def iter_record_batches(path: str, chunk_rows: int) -> Iterator[object]:
+    """Stream a Parquet or CSV file as Arrow record batches of about chunk_rows rows."""
+    import pyarrow as pa
+
+    if path.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        yield from pq.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+        return
+
+    import pyarrow.csv as pacsv
+
+    # Pin feature types up front: inference per block could disagree between blocks
+    header = pacsv.open_csv(path).schema.names
+    column_types = {}
+    for name in header:
+        if name.lower() in ("customer_id", "customer_segment"):
+            column_types[name] = pa.string()
+        elif name.lower() in NUMERIC_COLUMNS:
+            column_types[name] = pa.float64()
+    yield from pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=max(1 << 20, chunk_rows * CSV_BYTES_PER_ROW)),
+        convert_options=pacsv.ConvertOptions(column_types=column_types)
+    )
+
+
+def table_to_columns(table: Any) -> Dict[str, Any]:
+    """
+    Convert an Arrow table into the column mapping used by ChurnPredictor.
+
+    Numeric columns become float64 arrays with NaN for nulls, so the
+    predictor applies defaults without a per-row Python loop.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    by_name = {name.lower(): table.column(name) for name in table.column_names}
+    columns = {}
+    for name, _, _, _ in FEATURE_INPUTS:
+        column = by_name.get(name)
+        if column is None:
+            continue
+        if name == "customer_segment":
+            columns[name] = column.to_numpy(zero_copy_only=False)
+        else:
+            columns[name] = pc.cast(column, pa.float64()).to_numpy(zero_copy_only=False)
+    return columns
+
+
+def results_to_table(customer_ids: Any, results: Dict[str, np.ndarray], model_version: str) -> Any:
+    """Build the Arrow result table; model_version goes in the schema metadata."""
+    import pyarrow as pa
+
+    table = pa.table({
+        "customer_id": customer_ids,
+        "churn_probability": pa.array(results["churn_probability"], type=pa.float64()),
+        "churn_risk_category": pa.array(results["churn_risk_category"].tolist(), type=pa.string()),
+        "confidence_score": pa.array(results["confidence_score"], type=pa.float64()),
+        "days_until_likely_churn": pa.array(results["days_until_likely_churn"], type=pa.int32())
+    })
+    return table.replace_schema_metadata({"model_version": model_version})
+
+
+def score_arrow_stream(body: bytes) -> bytes:
+    """
+    Score an Arrow IPC stream and return the predictions as an Arrow IPC stream.
+
+    Runs entirely off the event loop (decode, score, encode), so it can be
+    submitted to the inference pool as one job.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    table = pa.ipc.open_stream(body).read_all()
+    by_name = {name.lower(): name for name in table.column_names}
+    if "customer_id" in by_name:
+        customer_ids = pc.fill_null(pc.cast(table.column(by_name["customer_id"]), pa.string()), "unknown")
+    else:
+        customer_ids = pa.array(["unknown"] * table.num_rows, type=pa.string())
+
+    model = get_model()
+    results = model.predict_arrays(table_to_columns(table))
+    output = results_to_table(customer_ids, results, model.model_version)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, output.schema) as writer:
+        writer.write_table(output)
+    return sink.getvalue().to_pybytes()
+
+
+def score_table(url: str, table: Any, timeout: float = 300) -> Any:
+    """
+    Client helper: send an Arrow table to /predict/arrow and return the predictions table.
+
+    Args:
+        url: Full URL of the /predict/arrow endpoint
+        table: pyarrow.Table with SNOWFLAKE_FIELD_ORDER columns
+        timeout: Request timeout in seconds
+
+    Returns:
+        pyarrow.Table of predictions, in input row order
+    """
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    request = urllib.request.Request(
+        url,
+        data=sink.getvalue().to_pybytes(),
+        headers={"Content-Type": ARROW_STREAM_MEDIA_TYPE, "Accept": ARROW_STREAM_MEDIA_TYPE},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return pa.ipc.open_stream(response.read()).read_all()
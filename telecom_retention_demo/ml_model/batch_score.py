@@ -0,0 +1,478 @@
+"""
+Offline batch scoring of full customer feature exports
+
+Scores a large Parquet/CSV export of customer features (the PREDICT_CHURN
+argument columns, any letter case) across a process pool and writes the
+predictions to one CSV file, in input order, ready for COPY INTO
+CHURN_PREDICTIONS. This replaces millions of calls to the HTTP service for
+the weekly full-base refresh.
+
+- The main process streams the input as record batches of --chunk-rows
+  rows and hands each one to a worker; at most 2 x --workers chunks are in
+  flight, so memory stays bounded.
+- Each worker loads the model once, at start-up, and keeps that instance
+  for the whole run (no reloads mid-run, every row gets the same model
+  version). It scores its chunk column-wise and returns the CSV bytes.
+- Results are appended strictly in chunk order. After every chunk the
+  output is flushed and a progress file (<output>.progress.json) records
+  the completed chunks and output size; --resume truncates the output to
+  that size and continues with the next chunk. The progress file is
+  removed once the run completes.
+- With --delta-store, a fingerprint store (see fingerprint_store) keeps
+  each customer's feature fingerprint and last prediction between runs.
+  Workers only score customers that are new or whose features changed and
+  copy the stored prediction for the rest; the main process writes the
+  new entries back after each chunk. A different model (version or
+  content, see ChurnPredictor.model_digest), rule table or output option
+  invalidates the whole store. --compact then drops customers missing
+  from this run's input and reclaims space.
+
+Output columns: customer_id, churn_probability, churn_risk_category,
+confidence_score, days_until_likely_churn, model_version, plus
+top_churn_factors and recommended_actions (JSON arrays) with --factors
+and one contribution_<feature> column per model feature (log-odds
+contributions, see tree_engine) with --contributions.
+
+Usage:
+    python batch_score.py --input features/ --output predictions.csv
+    python batch_score.py --input features.parquet --output predictions.csv --workers 8 --factors --resume
+    python batch_score.py --input features/ --output predictions.csv --contributions
+    python batch_score.py --input features/ --output predictions.csv --delta-store scores/ --compact
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from arrow_io import find_input_files, iter_record_batches, table_to_columns
+from fingerprint_store import FingerprintStore, StoreUpdate, customer_keys, fingerprint_rows
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OUTPUT_COLUMNS = ["customer_id", "churn_probability", "churn_risk_category", "confidence_score",
+                  "days_until_likely_churn", "model_version"]
+FACTOR_COLUMNS = ["top_churn_factors", "recommended_actions"]
+
+# Model instance of a worker process, loaded once by _init_worker
+_WORKER_MODEL = None
+
+# Read-only fingerprint store of a worker process, for delta scoring
+_WORKER_STORE = None
+
+
+def _init_worker():
+    """Load the model once per worker process and keep numeric libraries single-threaded."""
+    global _WORKER_MODEL
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+    from churn_predictor import get_model
+    _WORKER_MODEL = get_model()
+
+
+def _worker_store(store_path: Optional[str]) -> Optional[FingerprintStore]:
+    """Read-only fingerprint store of this worker process, opened on first use."""
+    global _WORKER_STORE
+    if store_path is None:
+        return None
+    if _WORKER_STORE is None or _WORKER_STORE.path != store_path:
+        _WORKER_STORE = FingerprintStore(store_path, read_only=True)
+    return _WORKER_STORE
+
+
+def _customer_id_column(table: Any) -> Optional[Any]:
+    """customer_id column of a table cast to string, or None if there is no such column."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    by_name = {name.lower(): name for name in table.column_names}
+    if "customer_id" not in by_name:
+        return None
+    return pc.cast(table.column(by_name["customer_id"]), pa.string())
+
+
+def _predictions_csv(model: Any, table: Any, raw_matrix: Optional[np.ndarray], with_factors: bool) -> bytes:
+    """Score a table and return its prediction rows as CSV without header."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+
+    id_column = _customer_id_column(table)
+    if id_column is not None:
+        customer_ids = pc.fill_null(id_column, "unknown")
+    else:
+        customer_ids = pa.array(["unknown"] * table.num_rows, type=pa.string())
+
+    columns = table_to_columns(table)
+    results = model.predict_arrays(columns)
+    output = {
+        "customer_id": customer_ids,
+        "churn_probability": np.round(results["churn_probability"], 4),
+        "churn_risk_category": pa.array(results["churn_risk_category"].tolist(), type=pa.string()),
+        "confidence_score": np.round(results["confidence_score"], 4),
+        "days_until_likely_churn": pa.array(results["days_until_likely_churn"], type=pa.int32()),
+        "model_version": pa.array([model.model_version] * table.num_rows, type=pa.string())
+    }
+    if "feature_contributions" in results:
+        for name, values in zip(model.feature_names, results["feature_contributions"].T):
+            output[f"contribution_{name}"] = np.round(values, 4)
+    if with_factors:
+        if raw_matrix is None:
+            raw_matrix = model._extract_raw_columns(columns, table.num_rows)
+        factors = model.rules.top_churn_factors(raw_matrix)
+        actions = model.rules.recommended_actions(raw_matrix, results["churn_risk_category"])
+        output["top_churn_factors"] = [json.dumps(row) for row in factors]
+        output["recommended_actions"] = [json.dumps(row) for row in actions]
+
+    sink = pa.BufferOutputStream()
+    pacsv.write_csv(pa.table(output), sink, pacsv.WriteOptions(include_header=False))
+    return sink.getvalue().to_pybytes()
+
+
+def score_chunk(batch: Any, with_factors: bool = False,
+                store_path: Optional[str] = None) -> Tuple[bytes, int, str, Optional[StoreUpdate], int]:
+    """
+    Score one record batch in a worker process.
+
+    With a fingerprint store, customers whose customer_id and normalised
+    features match their stored fingerprint get their stored prediction
+    line; only new or changed customers are scored.
+
+    Args:
+        batch: pyarrow RecordBatch of customer features
+        with_factors: Also write churn factors and recommended actions
+        store_path: Fingerprint store directory for delta scoring, or None to score every row
+
+    Returns:
+        (CSV bytes without header, number of rows, model version, store
+        update for the scored rows or None, number of reused rows)
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    model = _WORKER_MODEL
+    if model is None:
+        from churn_predictor import get_model
+        model = get_model()
+
+    table = pa.Table.from_batches([batch])
+    n_rows = table.num_rows
+    store = _worker_store(store_path)
+    id_column = _customer_id_column(table)
+    if store is None or id_column is None:
+        return _predictions_csv(model, table, None, with_factors), n_rows, model.model_version, None, 0
+
+    raw_matrix = model._extract_raw_columns(table_to_columns(table), n_rows)
+    ids = ["" if customer_id is None else customer_id for customer_id in id_column.to_pylist()]
+    keys, fingerprints = fingerprint_rows(ids, model._normalize(raw_matrix))
+    # Rows without a customer_id are always scored and never stored
+    has_id = ~pc.is_null(id_column).to_numpy(zero_copy_only=False)
+
+    # Stored lines are only valid for the model that wrote them: same version label and same content
+    signature = store.signature or {}
+    same_model = (signature.get("model_version") == model.model_version
+                  and signature.get("model_digest") == model.model_digest())
+    entries = np.full(n_rows, -1, dtype=np.int64)
+    if same_model:
+        entries = np.where(has_id, store.match(keys, fingerprints), -1)
+    reused = np.flatnonzero(entries >= 0)
+    scored = np.flatnonzero(entries < 0)
+
+    lines: List[Optional[bytes]] = [None] * n_rows
+    if len(scored):
+        subset = table if len(scored) == n_rows else table.take(pa.array(scored))
+        scored_csv = _predictions_csv(model, subset, raw_matrix[scored], with_factors)
+        for i, line in zip(scored.tolist(), _csv_records(scored_csv)):
+            lines[i] = line
+    for i, line in zip(reused.tolist(), store.predictions(entries[reused])):
+        lines[i] = line
+
+    update = None
+    if same_model:
+        stored = scored[has_id[scored]]
+        update = (keys[stored], fingerprints[stored], [lines[i] for i in stored.tolist()])
+    data = b"\n".join(lines) + b"\n" if n_rows else b""
+    return data, n_rows, model.model_version, update, len(reused)
+
+
+def _csv_records(data: bytes) -> List[bytes]:
+    """
+    Split CSV bytes into records, without their line terminators.
+
+    A newline only ends a record outside quotes, i.e. after an even number
+    of quote characters (escaped quotes are doubled, so they cancel out).
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    outside_quotes = (np.cumsum(buffer == ord('"')) & 1) == 0
+    ends = np.flatnonzero((buffer == ord("\n")) & outside_quotes)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    return [data[start:end] for start, end in zip(starts.tolist(), ends.tolist())]
+
+
+def store_signature(model: Any, with_factors: bool, with_contributions: bool) -> Dict[str, Any]:
+    """Everything a stored prediction depends on besides the customer's features."""
+    rules = json.dumps(model.rules.config, sort_keys=True).encode("utf-8")
+    return {
+        "model_version": model.model_version,
+        "model_digest": model.model_digest(),
+        "rules": hashlib.sha256(rules).hexdigest()[:16],
+        "factors": with_factors,
+        "contributions": with_contributions
+    }
+
+
+def count_input_rows(paths: List[str]) -> Optional[int]:
+    """Total rows from Parquet metadata, or None when any input is CSV."""
+    if not all(path.lower().endswith(".parquet") for path in paths):
+        return None
+    import pyarrow.parquet as pq
+    return sum(pq.ParquetFile(path).metadata.num_rows for path in paths)
+
+
+def input_signature(paths: List[str], chunk_rows: int, with_factors: bool,
+                    with_contributions: bool = False) -> Dict[str, Any]:
+    """Identity of a run; a progress file is only resumed with the same inputs and settings."""
+    files = []
+    for path in paths:
+        stat = os.stat(path)
+        files.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return {"files": files, "chunk_rows": chunk_rows, "factors": with_factors,
+            "contributions": with_contributions}
+
+
+class ProgressFile:
+    """Checkpoint of a scoring run: completed chunks, rows and output bytes."""
+
+    def __init__(self, output_path: str, signature: Dict[str, Any]):
+        self.path = output_path + ".progress.json"
+        self.signature = signature
+        self.chunks_done = 0
+        self.rows_done = 0
+        self.output_bytes = 0
+        self.model_version: Optional[str] = None
+
+    def load(self) -> bool:
+        """Restore a checkpoint of the same run; False when there is none to resume."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get("signature") != self.signature:
+            raise ValueError(f"{self.path} belongs to a run with different inputs or settings; "
+                             f"remove it or run without --resume")
+        self.chunks_done = state["chunks_done"]
+        self.rows_done = state["rows_done"]
+        self.output_bytes = state["output_bytes"]
+        self.model_version = state.get("model_version")
+        return True
+
+    def save(self):
+        """Write the checkpoint atomically."""
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "signature": self.signature,
+                "chunks_done": self.chunks_done,
+                "rows_done": self.rows_done,
+                "output_bytes": self.output_bytes,
+                "model_version": self.model_version
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """Delete the checkpoint after a completed run."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def score_files(paths: List[str], output_path: str, workers: int, chunk_rows: int = 100000,
+                with_factors: bool = False, resume: bool = False, progress_secs: float = 10.0,
+                with_contributions: bool = False, store_path: Optional[str] = None,
+                compact: bool = False) -> Dict[str, Any]:
+    """
+    Score the input files into output_path with a process pool.
+
+    Args:
+        paths: Parquet/CSV inputs, scored in order
+        output_path: Result CSV file
+        workers: Worker processes
+        chunk_rows: Rows per chunk (part of the resume signature)
+        with_factors: Include churn factors and recommended actions
+        resume: Continue from the progress file, if any
+        progress_secs: Seconds between progress log lines
+        with_contributions: Include per-feature contribution columns; the
+            workers must have CHURN_FEATURE_CONTRIBUTIONS=1 in their environment
+        store_path: Fingerprint store for delta scoring, or None to score every row
+        compact: After the run, drop store entries of customers not in the input
+
+    Returns:
+        Run summary (rows, reused rows, chunks, elapsed seconds, rows/s, model version)
+    """
+    signature = input_signature(paths, chunk_rows, with_factors, with_contributions)
+    store = None
+    if store_path:
+        from churn_predictor import get_model
+        signature["delta_store"] = os.path.abspath(store_path)
+        store = FingerprintStore(store_path)
+        if not store.check_signature(store_signature(get_model(), with_factors, with_contributions)):
+            logger.info("Fingerprint store invalidated; every customer is scored")
+        if compact:
+            store.begin_sweep()
+    progress = ProgressFile(output_path, signature)
+    if resume and progress.load():
+        logger.info(f"Resuming after chunk {progress.chunks_done} ({progress.rows_done} rows done)")
+        output = open(output_path, "r+b")
+        output.truncate(progress.output_bytes)
+        output.seek(progress.output_bytes)
+    else:
+        if resume:
+            logger.info(f"No progress file at {progress.path}, starting from the beginning")
+        output = open(output_path, "wb")
+        columns = list(OUTPUT_COLUMNS)
+        if with_contributions:
+            from churn_predictor import ChurnPredictor
+            columns += [f"contribution_{name}" for name in ChurnPredictor().feature_names]
+        if with_factors:
+            columns += FACTOR_COLUMNS
+        output.write((",".join(f'"{name}"' for name in columns) + "\n").encode("utf-8"))
+        progress.output_bytes = output.tell()
+        progress.save()
+
+    import pyarrow as pa
+
+    total_rows = count_input_rows(paths)
+    skip_chunks = progress.chunks_done
+    start = time.perf_counter()
+    rows_at_start = progress.rows_done
+    rows_reused = 0
+    last_report = start
+
+    def write_result(result: Tuple[bytes, int, str, Optional[StoreUpdate], int]):
+        nonlocal last_report, rows_reused
+        data, n_rows, model_version, update, n_reused = result
+        if progress.model_version not in (None, model_version):
+            logger.warning(f"Model version changed from {progress.model_version} to {model_version}")
+        output.write(data)
+        output.flush()
+        os.fsync(output.fileno())
+        if store is not None and update is not None:
+            store.append(*update)
+        rows_reused += n_reused
+        progress.chunks_done += 1
+        progress.rows_done += n_rows
+        progress.output_bytes = output.tell()
+        progress.model_version = model_version
+        progress.save()
+
+        now = time.perf_counter()
+        if now - last_report >= progress_secs:
+            last_report = now
+            rate = (progress.rows_done - rows_at_start) / (now - start)
+            if total_rows:
+                remaining = (total_rows - progress.rows_done) / rate if rate else 0
+                logger.info(f"{progress.rows_done}/{total_rows} rows ({progress.rows_done / total_rows:.1%}), "
+                            f"{rate:,.0f} rows/s, ~{remaining:.0f}s left")
+            else:
+                logger.info(f"{progress.rows_done} rows, {rate:,.0f} rows/s")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            in_flight = deque()
+            chunk_index = 0
+            for path in paths:
+                for batch in iter_record_batches(path, chunk_rows):
+                    chunk_index += 1
+                    if store is not None and compact:
+                        id_column = _customer_id_column(pa.Table.from_batches([batch]))
+                        if id_column is not None:
+                            store.mark_seen(customer_keys(id_column.drop_null().to_pylist()))
+                    if chunk_index <= skip_chunks:
+                        continue
+                    in_flight.append(executor.submit(score_chunk, batch, with_factors, store_path))
+                    if len(in_flight) >= 2 * workers:
+                        write_result(in_flight.popleft().result())
+            while in_flight:
+                write_result(in_flight.popleft().result())
+        if store is not None:
+            committed = store.commit(compact)
+            logger.info(f"Fingerprint store: {committed['entries']} customers, {committed['removed']} removed"
+                        + (", data file compacted" if committed["compacted"] else ""))
+    finally:
+        output.close()
+        if store is not None:
+            store.close()
+
+    elapsed = time.perf_counter() - start
+    scored = progress.rows_done - rows_at_start
+    progress.remove()
+    return {
+        "rows": progress.rows_done,
+        "rows_reused": rows_reused,
+        "chunks": progress.chunks_done,
+        "elapsed_secs": round(elapsed, 3),
+        "rows_per_sec": round(scored / elapsed, 1) if elapsed else 0.0,
+        "model_version": progress.model_version
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Score a customer feature export with a process pool")
+    parser.add_argument("--input", nargs="+", required=True,
+                        help="Parquet/CSV files, glob patterns or directories")
+    parser.add_argument("--output", required=True, help="Result CSV file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-rows", type=int, default=100000, help="Rows per chunk")
+    parser.add_argument("--factors", action="store_true",
+                        help="Include top churn factors and recommended actions")
+    parser.add_argument("--contributions", action="store_true",
+                        help="Include per-feature model contributions to the churn log-odds")
+    parser.add_argument("--delta-store", default=None,
+                        help="Fingerprint store directory; only new or changed customers are scored")
+    parser.add_argument("--compact", action="store_true",
+                        help="Drop store entries of customers missing from the input and reclaim space")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run")
+    parser.add_argument("--progress-secs", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--model", default=None, help="Model path (sets CHURN_MODEL_PATH)")
+    parser.add_argument("--engine", choices=("sklearn", "compiled"), default=None,
+                        help="Inference engine (sets CHURN_INFERENCE_ENGINE)")
+    args = parser.parse_args(argv)
+
+    # Configure before the workers load the model; every row is new, so no prediction cache
+    if args.model:
+        os.environ["CHURN_MODEL_PATH"] = args.model
+    if args.engine:
+        os.environ["CHURN_INFERENCE_ENGINE"] = args.engine
+    os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    os.environ["CHURN_FEATURE_CONTRIBUTIONS"] = "1" if args.contributions else "0"
+
+    paths = find_input_files(args.input)
+    if not paths:
+        logger.error(f"No Parquet/CSV input files found in {args.input}")
+        return 1
+    logger.info(f"Scoring {len(paths)} file(s) with {args.workers} workers")
+
+    summary = score_files(paths, args.output, args.workers, args.chunk_rows,
+                          args.factors, args.resume, args.progress_secs, args.contributions,
+                          args.delta_store, args.compact)
+    logger.info(
+        f"Scored {summary['rows']} rows ({summary['rows_reused']} reused) in {summary['elapsed_secs']}s "
+        f"({summary['rows_per_sec']:,.0f} rows/s) with model {summary['model_version']}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
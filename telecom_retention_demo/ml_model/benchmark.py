@@ -0,0 +1,305 @@
+"""
+Reproducible performance benchmarks for the churn scoring service
+
+Generates synthetic customers whose fields follow the CustomerFeatures
+ranges and measures, for each batch size:
+- predict: ChurnPredictor.predict, one customer per call
+- predict_batch: ChurnPredictor.predict_batch
+- snowflake: POST /predict with a Snowflake service function body
+- batch_endpoint: POST /predict/batch
+The HTTP cases run against the FastAPI app in process (Starlette's
+TestClient), so no server or network is involved.
+
+Each case reports throughput (rows/s), p50/p99/mean call latency and the
+peak resident set size sampled while it ran. Results are written as JSON;
+with --baseline they are compared against an earlier results file and the
+exit code is 1 if any case regressed by more than --max-regression.
+
+The prediction cache is disabled unless --cache is given, so repeated
+calls measure scoring rather than cache hits.
+
+Usage:
+    python benchmark.py --output results.json
+    python benchmark.py --sizes 1 100 10000 --benchmarks predict_batch snowflake
+    python benchmark.py --output current.json --baseline baseline.json --max-regression 0.10
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from synthetic_data import generate_customers
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BENCHMARKS = ("predict", "predict_batch", "snowflake", "batch_endpoint")
+DEFAULT_SIZES = (1, 10, 100, 1000, 10000, 100000)
+
+# Interval of the background RSS sampler, in seconds
+RSS_SAMPLE_SECS = 0.005
+
+
+class PeakRSSSampler:
+    """Track the peak resident set size of this process while active."""
+
+    def __init__(self):
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def current_bytes() -> int:
+        """Current RSS from /proc, or the lifetime peak where /proc is unavailable."""
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_SECS):
+            self.peak_bytes = max(self.peak_bytes, self.current_bytes())
+
+    def __enter__(self) -> "PeakRSSSampler":
+        self.peak_bytes = self.current_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self.current_bytes())
+
+
+def time_case(call: Callable[[], Any], rows_per_call: int, min_repeats: int,
+              max_repeats: int, min_time: float) -> Dict[str, Any]:
+    """
+    Call a benchmark body repeatedly and summarise its latency.
+
+    Runs one untimed warm-up call, then at least min_repeats timed calls,
+    continuing until min_time seconds have elapsed or max_repeats is reached.
+    """
+    call()
+    durations = []
+    with PeakRSSSampler() as rss:
+        started = time.perf_counter()
+        while len(durations) < max_repeats and (
+            len(durations) < min_repeats or time.perf_counter() - started < min_time
+        ):
+            start = time.perf_counter()
+            call()
+            durations.append(time.perf_counter() - start)
+
+    durations = np.array(durations)
+    return {
+        "repeats": len(durations),
+        "rows_per_sec": round(rows_per_call * len(durations) / float(durations.sum()), 1),
+        "p50_ms": round(float(np.percentile(durations, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(durations, 99)) * 1000, 3),
+        "mean_ms": round(float(durations.mean()) * 1000, 3),
+        "peak_rss_mb": round(rss.peak_bytes / 2 ** 20, 1)
+    }
+
+
+def build_case(benchmark: str, size: int, seed: int) -> Optional[Callable[[], Any]]:
+    """Return a zero-argument callable running one call of a benchmark, or None if not applicable."""
+    from churn_predictor import get_model
+
+    customers = generate_customers(size, seed)
+
+    if benchmark == "predict":
+        if size != 1:
+            return None
+        model = get_model()
+        return lambda: model.predict(customers[0])
+
+    if benchmark == "predict_batch":
+        model = get_model()
+        return lambda: model.predict_batch(customers)
+
+    client = _test_client()
+    if benchmark == "snowflake":
+        from app import SNOWFLAKE_FIELD_ORDER
+        rows = [[i] + [customer.get(name) for name in SNOWFLAKE_FIELD_ORDER] for i, customer in enumerate(customers)]
+        path, body = "/predict", {"data": rows}
+    else:
+        path, body = "/predict/batch", {"customers": customers}
+
+    # Encode once so the client-side JSON encoding is not part of the measurement
+    content = json.dumps(body).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+
+    def call():
+        response = client.post(path, content=content, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+
+    return call
+
+
+_CLIENT = None
+
+
+def _test_client():
+    """In-process ASGI client for the FastAPI app (requires httpx)."""
+    global _CLIENT
+    if _CLIENT is None:
+        from fastapi.testclient import TestClient
+        from app import app
+        # Per-request log lines would swamp the report
+        logging.getLogger("app").setLevel(logging.WARNING)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        _CLIENT = TestClient(app)
+    return _CLIENT
+
+
+def run_benchmarks(benchmarks: List[str], sizes: List[int], seed: int, min_repeats: int,
+                   max_repeats: int, min_time: float) -> List[Dict[str, Any]]:
+    """Run every applicable (benchmark, batch size) case and collect the results."""
+    results = []
+    for benchmark in benchmarks:
+        for size in sizes:
+            call = build_case(benchmark, size, seed)
+            if call is None:
+                continue
+            result = {"benchmark": benchmark, "batch_size": size}
+            result.update(time_case(call, size, min_repeats, max_repeats, min_time))
+            logger.info(
+                f"{benchmark:>14} n={size:<7} {result['rows_per_sec']:>12,.0f} rows/s  "
+                f"p50 {result['p50_ms']:>10.3f} ms  p99 {result['p99_ms']:>10.3f} ms  "
+                f"rss {result['peak_rss_mb']:.0f} MB"
+            )
+            results.append(result)
+    return results
+
+
+def environment_info() -> Dict[str, Any]:
+    """Versions and configuration that affect the numbers."""
+    from churn_predictor import get_model
+
+    model = get_model()
+    info = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "model_version": model.model_version,
+        "engine": model.engine,
+        "env": {
+            name: value for name, value in os.environ.items()
+            if name.startswith(("CHURN_", "INFERENCE_", "MICRO_BATCH_", "PREDICTION_CACHE_"))
+        }
+    }
+    try:
+        import sklearn
+        info["sklearn"] = sklearn.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def compare_results(current: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+                    max_regression: float) -> List[Dict[str, Any]]:
+    """
+    Compare two result lists case by case.
+
+    A case regresses when its throughput drops, or its p99 latency grows,
+    by more than max_regression (a fraction). Cases missing from either
+    side are ignored.
+
+    Returns:
+        One entry per shared case with the relative changes and a regressed flag
+    """
+    previous = {(r["benchmark"], r["batch_size"]): r for r in baseline}
+    comparison = []
+    for result in current:
+        before = previous.get((result["benchmark"], result["batch_size"]))
+        if before is None:
+            continue
+        throughput_change = result["rows_per_sec"] / before["rows_per_sec"] - 1
+        p99_change = result["p99_ms"] / before["p99_ms"] - 1 if before["p99_ms"] else 0.0
+        comparison.append({
+            "benchmark": result["benchmark"],
+            "batch_size": result["batch_size"],
+            "throughput_change": round(throughput_change, 4),
+            "p99_change": round(p99_change, 4),
+            "regressed": throughput_change < -max_regression or p99_change > max_regression
+        })
+    return comparison
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark churn scoring throughput and latency")
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS),
+                        help="Benchmarks to run (default: all)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES),
+                        help="Batch sizes (default: 1 10 100 1000 10000 100000)")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic data seed")
+    parser.add_argument("--min-repeats", type=int, default=3, help="Minimum timed calls per case")
+    parser.add_argument("--max-repeats", type=int, default=1000, help="Maximum timed calls per case")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Minimum seconds spent per case")
+    parser.add_argument("--model", default=None, help="Model path (sets CHURN_MODEL_PATH)")
+    parser.add_argument("--engine", choices=("sklearn", "compiled"), default=None,
+                        help="Inference engine (sets CHURN_INFERENCE_ENGINE)")
+    parser.add_argument("--cache", action="store_true", help="Keep the prediction cache enabled")
+    parser.add_argument("--output", default=None, help="Write results JSON to this file")
+    parser.add_argument("--baseline", default=None, help="Results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Allowed throughput drop / p99 increase against the baseline (fraction)")
+    args = parser.parse_args(argv)
+
+    # Configure before churn_predictor and app are imported
+    if args.model:
+        os.environ["CHURN_MODEL_PATH"] = args.model
+    if args.engine:
+        os.environ["CHURN_INFERENCE_ENGINE"] = args.engine
+    if not args.cache:
+        os.environ["PREDICTION_CACHE_SIZE"] = "0"
+
+    report = {
+        "environment": environment_info(),
+        "results": run_benchmarks(args.benchmarks, args.sizes, args.seed,
+                                  args.min_repeats, args.max_repeats, args.min_time)
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["comparison"] = compare_results(report["results"], baseline["results"], args.max_regression)
+        for entry in report["comparison"]:
+            status = "REGRESSED" if entry["regressed"] else "ok"
+            logger.info(
+                f"{entry['benchmark']:>14} n={entry['batch_size']:<7} throughput {entry['throughput_change']:+.1%}  "
+                f"p99 {entry['p99_change']:+.1%}  {status}"
+            )
+        if any(entry["regressed"] for entry in report["comparison"]):
+            logger.error(f"Performance regressed by more than {args.max_regression:.0%} against {args.baseline}")
+            exit_code = 1
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        logger.info(f"Results written to {args.output}")
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,28 +11,184 @@ This model predicts customer churn probability based on:
 
 import os
 import json
+import pickle
+import hashlib
+import time
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Sequence
 import numpy as np
-from sklearn.ensemble import GradientBoostingClassifier
-from sklearn.preprocessing import StandardScaler
-import joblib
+from tree_engine import CompiledTreeEnsemble, CompiledScaler, save_artifact, load_artifact
+from rule_engine import RuleSet
+from metrics import STAGE_SECONDS, SCORED_BATCH_SIZE, count_predictions
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# (input field, default, offset, divisor) per model feature:
+# feature = (raw value + offset) / divisor
+FEATURE_INPUTS = [
+    ('avg_data_usage_pct', 50, 0, 100),
+    ('data_usage_trend', 0, 0, 1),
+    ('avg_voice_usage_pct', 50, 0, 100),
+    ('avg_days_inactive', 1, 0, 1),
+    ('avg_signal_strength', -70, 110, 60),
+    ('total_dropped_calls', 0, 0, 1),
+    ('coverage_issues_count', 0, 0, 1),
+    ('complaint_count', 0, 0, 1),
+    ('negative_sentiment_count', 0, 0, 1),
+    ('avg_nps_score', 7, 0, 10),
+    ('tenure_months', 12, 0, 60),
+    ('monthly_fee', 50, 0, 100),
+    ('payment_issues_count', 0, 0, 1),
+    ('customer_segment', 'Standard', 0, 1),
+    ('contract_months_remaining', 12, 0, 24)
+]
+FEATURE_OFFSETS = np.array([offset for _, _, offset, _ in FEATURE_INPUTS], dtype=np.float64)
+FEATURE_DIVISORS = np.array([divisor for _, _, _, divisor in FEATURE_INPUTS], dtype=np.float64)
+
+# Boundary rows checked when fusing preprocessing into the trees (see _fuse_preprocessing)
+FUSION_CHECK_ROWS = 4096
+
+# Churn probability from which a customer is High / Medium risk (below Medium is Low)
+HIGH_RISK_THRESHOLD = 0.60
+MEDIUM_RISK_THRESHOLD = 0.30
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache of prediction results with a time-to-live.
+    
+    Keys are the bytes of a customer's normalised feature vector plus the
+    model version, so a customer whose features are unchanged is served
+    without re-scoring. Values omit customer_id, which is filled in per hit.
+    """
+    
+    def __init__(self, max_size: int = 10000, ttl_secs: float = 3600):
+        self.max_size = max_size
+        self.ttl_secs = ttl_secs
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_env(cls) -> Optional["PredictionCache"]:
+        """Create a cache from PREDICTION_CACHE_* variables; None when disabled."""
+        max_size = int(os.environ.get("PREDICTION_CACHE_SIZE", "10000"))
+        if max_size <= 0:
+            return None
+        return cls(max_size, float(os.environ.get("PREDICTION_CACHE_TTL_SECS", "3600")))
+    
+    @staticmethod
+    def make_key(feature_vector: np.ndarray, model_version: str) -> bytes:
+        """Cache key for one normalised feature vector."""
+        return model_version.encode("utf-8") + b"\0" + np.ascontiguousarray(feature_vector).tobytes()
+    
+    def get_many(self, keys: List[bytes], count_misses: bool = True) -> List[Optional[Dict[str, Any]]]:
+        """
+        Look up several keys at once; expired entries count as misses.
+        
+        Pass count_misses=False for a probe whose misses will be looked up
+        again on the scoring path, so they are not counted twice.
+        """
+        now = time.monotonic()
+        found = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    found.append(entry[1])
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                    if count_misses:
+                        self.misses += 1
+                    found.append(None)
+        return found
+    
+    def put_many(self, keys: List[bytes], values: List[Dict[str, Any]]):
+        """Store results, evicting least recently used entries beyond max_size."""
+        expires_at = time.monotonic() + self.ttl_secs
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self, reset_stats: bool = False):
+        """Drop every entry (e.g. after the model is reloaded), optionally zeroing the counters."""
+        with self._lock:
+            self._entries.clear()
+            if reset_stats:
+                self.hits = 0
+                self.misses = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Size, configuration and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_secs": self.ttl_secs,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
 class ChurnPredictor:
     """
     Churn prediction model for telecom customers.
     Uses gradient boosting classifier trained on customer features.
+    
+    Scoring runs through sklearn's predict_proba ("sklearn" engine) or a
+    flattened, vectorized copy of the ensemble ("compiled" engine). The
+    engine defaults to the CHURN_INFERENCE_ENGINE environment variable.
+    
+    A compiled .npz artifact (see export_artifact) is loaded with NumPy only;
+    sklearn and joblib are imported lazily when a joblib model is needed.
+    
+    With mmap enabled (CHURN_MODEL_MMAP=1) the artifact is memory-mapped
+    read-only so every uvicorn worker shares one physical copy; the first
+    worker to start creates the artifact if it does not exist yet.
+    
+    With CHURN_FEATURE_CONTRIBUTIONS=1 every result also carries
+    feature_contributions: the model's per-feature contributions to the
+    churn log-odds (tree-path attribution, see tree_engine), next to the
+    rule-based top_churn_factors.
+    
+    With CHURN_FUSED_PREPROCESSING=1 the _normalize step and the scaler
+    are folded into a copy of the compiled tree thresholds at load time,
+    so raw feature rows are scored directly (see
+    CompiledTreeEnsemble.fuse_input_transform).
     """
     
-    def __init__(self, model_path: str = None):
+    ENGINES = ("sklearn", "compiled")
+    
+    def __init__(self, model_path: str = None, engine: str = None, mmap: bool = None):
+        model_path = model_path or os.environ.get("CHURN_MODEL_PATH")
         self.model_path = model_path or "/app/model/churn_model.joblib"
         self.scaler_path = model_path.replace(".joblib", "_scaler.joblib") if model_path else "/app/model/churn_scaler.joblib"
+        self.artifact_path = os.path.splitext(self.model_path)[0] + ".npz"
+        # Sidecar written next to the joblib files; records the model version
+        self.metadata_path = os.path.splitext(self.model_path)[0] + "_metadata.json"
         self.model = None
         self.scaler = None
+        self.engine = engine or os.environ.get("CHURN_INFERENCE_ENGINE", "sklearn")
+        self.compiled_model = None
+        if mmap is None:
+            mmap = os.environ.get("CHURN_MODEL_MMAP", "0").lower() in ("1", "true", "yes")
+        self.mmap = mmap
+        self.reload_check_secs = float(os.environ.get("CHURN_MODEL_RELOAD_SECS", "5"))
+        # Files the model was loaded from and their signatures, see artifact_changed
+        self._artifact_files = ()
+        self._artifact_signature = None
+        self._artifact_checked_at = 0.0
         self.feature_names = [
             'avg_data_usage_pct',
             'data_usage_trend',
@@ -51,23 +207,196 @@ class ChurnPredictor:
             'contract_months_remaining'
         ]
         self.model_version = "v2.0.0"
+        self.rules = RuleSet.load(self.feature_names)
+        self.cache = PredictionCache.from_env()
+        # Optional candidate scorer fed a sample of live traffic (see model_registry.ShadowScorer)
+        self.shadow = None
+        self.feature_contributions = os.environ.get("CHURN_FEATURE_CONTRIBUTIONS", "0").lower() in ("1", "true", "yes")
+        self.fused_preprocessing = os.environ.get("CHURN_FUSED_PREPROCESSING", "0").lower() in ("1", "true", "yes")
+        # Compiled copy of an sklearn model, used for feature contributions and triage scoring
+        self._compiled_copy = None
+        # Compiled ensemble with the preprocessing folded into its thresholds
+        self._fused_model = None
+        # Content hash of the loaded trees and scaler, see model_digest
+        self._model_digest = None
+        
+    def load_model(self, engine: str = None, fallback: bool = True):
+        """
+        Load the trained model and scaler from disk.
+        
+        Args:
+            engine: Inference engine to use ("sklearn" or "compiled");
+                keeps the current engine when omitted
+            fallback: Train the default demo model when loading fails;
+                with False the error is raised instead
+        """
+        if engine is not None:
+            self.engine = engine
+        if self.engine not in self.ENGINES:
+            raise ValueError(f"Unknown inference engine: {self.engine}")
+        self.compiled_model = None
+        self._compiled_copy = None
+        self._fused_model = None
+        self._model_digest = None
+        self._artifact_signature = None
+        if self.cache is not None:
+            self.cache.clear()
+        
+        if self.mmap:
+            self.engine = "compiled"
+            self._ensure_artifact()
         
-    def load_model(self):
-        """Load the trained model and scaler from disk."""
         try:
-            if os.path.exists(self.model_path):
+            if self.model_path.endswith(".npz") or (
+                self.engine == "compiled" and os.path.exists(self.artifact_path)
+            ):
+                self._load_artifact()
+            elif os.path.exists(self.model_path):
+                import joblib
+                files = (self.model_path, self.scaler_path)
+                signature = _files_signature(files)
                 self.model = joblib.load(self.model_path)
                 self.scaler = joblib.load(self.scaler_path)
+                self._load_metadata()
+                self._watch_files(files, signature)
                 logger.info(f"Model loaded from {self.model_path}")
-            else:
+            elif fallback:
                 logger.warning("Model not found, initializing with default model")
                 self._initialize_default_model()
+            else:
+                raise FileNotFoundError(f"Model not found: {self.model_path}")
         except Exception as e:
+            if not fallback:
+                raise
             logger.error(f"Error loading model: {e}")
             self._initialize_default_model()
+        
+        if self.engine == "compiled" and self.compiled_model is None:
+            self.compiled_model = CompiledTreeEnsemble.from_sklearn(self.model)
+            logger.info(f"Compiled {self.compiled_model.n_trees} trees for vectorized inference")
+        
+        if self.feature_contributions and self.compiled_model is not None and not self.compiled_model.has_covers:
+            logger.warning("Model artifact has no leaf covers; feature contributions disabled (re-export it)")
+            self.feature_contributions = False
+        
+        if self.fused_preprocessing:
+            try:
+                self._fused_model = self._fuse_preprocessing()
+                logger.info("Preprocessing fused into the tree thresholds")
+            except ValueError as e:
+                logger.error(f"Preprocessing fusion disabled: {e}")
+    
+    def _fuse_preprocessing(self) -> CompiledTreeEnsemble:
+        """
+        Fold _normalize and the scaler into a copy of the compiled ensemble.
+        
+        The fused ensemble is checked against the unfused path on rows that
+        sit exactly on, and just above, its fused thresholds (at most
+        FUSION_CHECK_ROWS of them); any difference in the leaves reached
+        raises ValueError.
+        """
+        ensemble = self._tree_ensemble()
+        scaler = self.scaler if isinstance(self.scaler, CompiledScaler) else CompiledScaler.from_sklearn(self.scaler)
+        if (FEATURE_DIVISORS <= 0).any() or (scaler.scale_ <= 0).any():
+            raise ValueError("non-positive divisor or scale; the preprocessing is not increasing")
+        
+        def preprocess(values: np.ndarray, features: np.ndarray) -> np.ndarray:
+            # Same operations, in the same order, as _normalize and scaler.transform
+            normalized = (values + FEATURE_OFFSETS[features]) / FEATURE_DIVISORS[features]
+            return (normalized - scaler.mean_[features]) / scaler.scale_[features]
+        
+        fused = ensemble.fuse_input_transform(preprocess)
+        
+        internal = np.isfinite(fused.threshold)
+        boundaries = np.unique(np.column_stack([fused.feature[internal], fused.threshold[internal]]), axis=0)
+        if len(boundaries) > FUSION_CHECK_ROWS // 2:
+            rng = np.random.default_rng(0)
+            boundaries = boundaries[rng.choice(len(boundaries), FUSION_CHECK_ROWS // 2, replace=False)]
+        features = boundaries[:, 0].astype(np.int64)
+        values = np.concatenate([boundaries[:, 1], np.nextafter(boundaries[:, 1], np.inf)])
+        rows = np.repeat(self._extract_raw_matrix([{}]), len(values), axis=0)
+        rows[np.arange(len(values)), np.concatenate([features, features])] = values
+        if not np.array_equal(fused.leaf_indices(rows), ensemble.leaf_indices(self.scaler.transform(self._normalize(rows)))):
+            raise ValueError("fused thresholds do not reproduce the unfused tree paths")
+        return fused
+    
+    def _load_artifact(self):
+        """Load a compiled .npz artifact; no sklearn model is kept."""
+        files = (self.artifact_path,)
+        signature = _files_signature(files)
+        self.compiled_model, self.scaler, metadata = load_artifact(self.artifact_path, mmap=self.mmap)
+        self.model = None
+        self.engine = "compiled"
+        self.model_version = metadata.get("model_version", self.model_version)
+        self._watch_files(files, signature)
+        mode = "memory-mapped" if self.mmap else "loaded"
+        logger.info(f"Compiled model artifact {mode} from {self.artifact_path}")
+    
+    def _watch_files(self, files: Sequence[str], signature: tuple):
+        """Remember the files the model was loaded from, with their signatures taken before loading."""
+        self._artifact_files = tuple(files)
+        self._artifact_signature = signature
+        self._artifact_checked_at = time.monotonic()
+    
+    def _load_metadata(self):
+        """Read the model version from the joblib metadata sidecar, when one was saved."""
+        if not os.path.exists(self.metadata_path):
+            return
+        with open(self.metadata_path) as f:
+            metadata = json.load(f)
+        self.model_version = metadata.get("model_version", self.model_version)
+    
+    def _ensure_artifact(self):
+        """Create the shared artifact once, under a file lock, if it does not exist yet."""
+        if os.path.exists(self.artifact_path):
+            return
+        import fcntl
+        
+        directory = os.path.dirname(self.artifact_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.artifact_path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(self.artifact_path):
+                return
+            builder = ChurnPredictor(
+                model_path=os.path.splitext(self.model_path)[0] + ".joblib",
+                engine="sklearn",
+                mmap=False
+            )
+            builder.load_model()
+            builder.export_artifact(self.artifact_path)
+    
+    def artifact_changed(self, force: bool = False) -> bool:
+        """
+        True when a file this model was loaded from has been replaced.
+        
+        That is the .npz artifact, or the joblib model and scaler files.
+        Checked at most every CHURN_MODEL_RELOAD_SECS seconds unless force is
+        set; a new version is published by atomically replacing the files
+        (see save_artifact and save_model).
+        """
+        if self._artifact_signature is None:
+            return False
+        now = time.monotonic()
+        if not force and now - self._artifact_checked_at < self.reload_check_secs:
+            return False
+        self._artifact_checked_at = now
+        try:
+            return _files_signature(self._artifact_files) != self._artifact_signature
+        except OSError:
+            return False
+    
+    @property
+    def is_loaded(self) -> bool:
+        """True once a model is available for scoring."""
+        return self.model is not None or self.compiled_model is not None
     
     def _initialize_default_model(self):
         """Initialize a default model for demo purposes."""
+        from sklearn.ensemble import GradientBoostingClassifier
+        from sklearn.preprocessing import StandardScaler
+        
         np.random.seed(42)
         n_samples = 1000
         X = np.random.randn(n_samples, len(self.feature_names))
@@ -87,179 +416,535 @@ class ChurnPredictor:
         logger.info("Default model initialized")
     
     def save_model(self):
-        """Save model and scaler to disk."""
+        """Save model, scaler and version metadata to disk."""
+        import joblib
+        
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        joblib.dump(self.model, self.model_path)
-        joblib.dump(self.scaler, self.scaler_path)
+        # Each file is written aside and moved into place, the model last, so
+        # services reloading a replaced model never read a partial file
+        suffix = f".tmp-{os.getpid()}"
+        with open(self.metadata_path + suffix, "w") as f:
+            json.dump({
+                "model_version": self.model_version,
+                "feature_names": self.feature_names
+            }, f, indent=2)
+        joblib.dump(self.scaler, self.scaler_path + suffix)
+        joblib.dump(self.model, self.model_path + suffix)
+        for path in (self.metadata_path, self.scaler_path, self.model_path):
+            os.replace(path + suffix, path)
         logger.info(f"Model saved to {self.model_path}")
     
-    def predict(self, features: Dict[str, Any]) -> Dict[str, Any]:
+    def export_artifact(self, path: str = None) -> str:
         """
-        Predict churn probability for a single customer.
+        Export the model as a compiled .npz artifact that loads without sklearn.
         
         Args:
-            features: Dictionary with customer features
+            path: Destination file (defaults to artifact_path)
             
         Returns:
-            Dictionary with churn probability and risk category
+            Path of the written artifact
         """
-        if self.model is None:
+        if not self.is_loaded:
             self.load_model()
+        path = path or self.artifact_path
+        ensemble = self.compiled_model or CompiledTreeEnsemble.from_sklearn(self.model)
+        scaler = self.scaler if isinstance(self.scaler, CompiledScaler) else CompiledScaler.from_sklearn(self.scaler)
         
-        feature_vector = self._extract_features(features)
-        feature_array = np.array(feature_vector).reshape(1, -1)
-        feature_scaled = self.scaler.transform(feature_array)
-        
-        churn_prob = self.model.predict_proba(feature_scaled)[0][1]
-        risk_category = self._get_risk_category(churn_prob)
-        top_factors = self._get_top_churn_factors(features, feature_vector)
-        recommended_actions = self._get_recommended_actions(risk_category, features)
-        days_until_churn = self._estimate_days_until_churn(churn_prob, features)
-        
-        return {
-            "customer_id": features.get("customer_id", "unknown"),
-            "churn_probability": round(float(churn_prob), 4),
-            "churn_risk_category": risk_category,
-            "top_churn_factors": top_factors,
-            "recommended_actions": recommended_actions,
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        save_artifact(path, ensemble, scaler, {
             "model_version": self.model_version,
-            "confidence_score": round(float(max(churn_prob, 1 - churn_prob)), 4),
-            "days_until_likely_churn": days_until_churn,
-            "prediction_timestamp": datetime.utcnow().isoformat()
-        }
+            "feature_names": self.feature_names
+        })
+        return path
     
-    def predict_batch(self, customers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Predict churn for multiple customers."""
-        return [self.predict(customer) for customer in customers]
+    def warm_up(self, n_rows: int = 32):
+        """
+        Score a small batch of default customers once, outside the cache.
+        
+        Loads the model if needed and exercises the scaler, the inference
+        engine and the rule table so the first real request does not pay
+        for lazy initialisation.
+        """
+        if not self.is_loaded:
+            self.load_model()
+        raw_matrix = self._extract_raw_matrix([{}] * n_rows)
+        churn_probs = self.predict_raw(raw_matrix)
+        risk_categories = self._get_risk_categories(churn_probs)
+        self.rules.top_churn_factors(raw_matrix)
+        self.rules.recommended_actions(raw_matrix, risk_categories)
+        self.rules.days_until_churn(raw_matrix, churn_probs)
     
-    def _extract_features(self, features: Dict[str, Any]) -> List[float]:
-        """Extract feature vector from customer data."""
-        return [
-            features.get('avg_data_usage_pct', 50) / 100,
-            features.get('data_usage_trend', 0),
-            features.get('avg_voice_usage_pct', 50) / 100,
-            features.get('avg_days_inactive', 1),
-            (features.get('avg_signal_strength', -70) + 110) / 60,
-            features.get('total_dropped_calls', 0),
-            features.get('coverage_issues_count', 0),
-            features.get('complaint_count', 0),
-            features.get('negative_sentiment_count', 0),
-            features.get('avg_nps_score', 7) / 10,
-            features.get('tenure_months', 12) / 60,
-            features.get('monthly_fee', 50) / 100,
-            features.get('payment_issues_count', 0),
-            1 if features.get('customer_segment', 'Standard') == 'Premium' else 0,
-            features.get('contract_months_remaining', 12) / 24
-        ]
+    def predict_raw(self, raw_matrix: np.ndarray) -> np.ndarray:
+        """Churn probabilities for a raw feature matrix, bypassing the cache and result building."""
+        return self._predict_proba(self._model_input(raw_matrix))
     
-    def _get_risk_category(self, probability: float) -> str:
-        """Categorize churn risk based on probability."""
-        if probability >= 0.60:
-            return "High"
-        elif probability >= 0.30:
-            return "Medium"
-        return "Low"
+    def predict(self, features: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Predict churn probability for a single customer.
+        
+        Args:
+            features: Dictionary with customer features
+            
+        Returns:
+            Dictionary with churn probability and risk category
+        """
+        return self.predict_batch([features])[0]
     
-    def _get_top_churn_factors(self, features: Dict[str, Any], feature_vector: List[float]) -> List[str]:
-        """Identify top contributing factors to churn risk."""
-        factors = []
+    def predict_batch(self, customers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Predict churn for multiple customers in a single vectorized pass.
+        
+        The whole batch is stacked into one feature matrix, scaled and scored
+        with a single predict_proba call; risk categories, confidence and
+        days-until-churn are derived with array operations.
+        
+        Args:
+            customers: List of customer feature dictionaries
+            
+        Returns:
+            List of prediction dictionaries, in input order
+        """
+        if not self.is_loaded:
+            self.load_model()
+        if not customers:
+            return []
         
-        if features.get('avg_data_usage_pct', 100) < 30:
-            factors.append("Low data usage (< 30% of plan)")
+        customer_ids = [features.get("customer_id", "unknown") for features in customers]
+        with STAGE_SECONDS.time(stage="extract"):
+            raw_matrix = self._extract_raw_matrix(customers)
+        return self._score_batch(raw_matrix, customer_ids)
+    
+    def predict_columns(self, columns: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+        """
+        Predict churn for a batch supplied column-wise.
         
-        if features.get('data_usage_trend', 0) < -0.2:
-            factors.append("Declining usage trend")
+        Each column holds one raw input field for every row (e.g. the decoded
+        Snowflake service function rows). Missing columns and None values fall
+        back to the same defaults as _extract_features.
         
-        if features.get('avg_signal_strength', -70) < -85:
-            factors.append("Poor network signal quality")
+        Args:
+            columns: Mapping of input field name to its per-row values
+            
+        Returns:
+            List of prediction dictionaries, in row order
+        """
+        if not self.is_loaded:
+            self.load_model()
+        n_rows = len(next(iter(columns.values()), []))
+        if n_rows == 0:
+            return []
         
-        if features.get('total_dropped_calls', 0) > 3:
-            factors.append("Frequent dropped calls")
+        ids = columns.get("customer_id")
+        customer_ids = ["unknown" if v is None else v for v in ids] if ids is not None else ["unknown"] * n_rows
+        with STAGE_SECONDS.time(stage="extract"):
+            raw_matrix = self._extract_raw_columns(columns, n_rows)
+        return self._score_batch(raw_matrix, customer_ids)
+    
+    def predict_arrays(self, columns: Dict[str, Sequence[Any]]) -> Dict[str, np.ndarray]:
+        """
+        Score a column-wise batch and return the results as arrays.
         
-        if features.get('coverage_issues_count', 0) > 0:
-            factors.append("Network coverage complaints")
+        Unlike predict_columns no per-customer dictionaries, churn factors or
+        recommended actions are built; this is the path for columnar (Arrow)
+        clients. Numeric NumPy columns may use NaN for missing values.
         
-        if features.get('complaint_count', 0) > 2:
-            factors.append("Multiple support complaints")
+        Args:
+            columns: Mapping of input field name to its per-row values
+            
+        Returns:
+            Dictionary of churn_probability, churn_risk_category,
+            confidence_score and days_until_likely_churn arrays, in row order,
+            plus an (n_rows, n_features) feature_contributions array when
+            feature contributions are enabled
+        """
+        if not self.is_loaded:
+            self.load_model()
+        n_rows = len(next(iter(columns.values()), []))
+        with STAGE_SECONDS.time(stage="extract"):
+            raw_matrix = self._extract_raw_columns(columns, n_rows)
+        if n_rows == 0:
+            churn_probs = np.empty(0, dtype=np.float64)
+        else:
+            SCORED_BATCH_SIZE.observe(n_rows)
+            with STAGE_SECONDS.time(stage="scale"):
+                model_input = self._model_input(raw_matrix)
+            with STAGE_SECONDS.time(stage="predict_proba"):
+                churn_probs = self._predict_proba(model_input)
         
-        if features.get('negative_sentiment_count', 0) > 1:
-            factors.append("Negative customer sentiment")
+        with STAGE_SECONDS.time(stage="rules"):
+            risk_categories = self._get_risk_categories(churn_probs)
+            days_until_churn = self.rules.days_until_churn(raw_matrix, churn_probs)
+        count_predictions(risk_categories)
+        if self.shadow is not None and n_rows:
+            self.shadow.submit(raw_matrix, churn_probs, risk_categories)
         
-        if features.get('avg_nps_score', 7) < 5:
-            factors.append("Low NPS score")
+        results = {
+            "churn_probability": churn_probs,
+            "churn_risk_category": risk_categories,
+            "confidence_score": np.maximum(churn_probs, 1 - churn_probs),
+            "days_until_likely_churn": days_until_churn
+        }
+        if self.feature_contributions:
+            if n_rows == 0:
+                results["feature_contributions"] = np.empty((0, len(self.feature_names)))
+            else:
+                with STAGE_SECONDS.time(stage="contributions"):
+                    results["feature_contributions"] = self._contributions(model_input)
+        return results
+    
+    def triage_columns(self, columns: Dict[str, Sequence[Any]]) -> Dict[str, np.ndarray]:
+        """
+        Risk categories for a column-wise batch, scoring only as many boosting stages as needed.
         
-        if features.get('payment_issues_count', 0) > 0:
-            factors.append("Payment issues")
+        Stages are evaluated in order and a customer stops as soon as the
+        remaining trees' largest/smallest leaf values can no longer move it
+        across a risk threshold, so clearly Low or High customers usually
+        need only part of the ensemble. Categories are identical to full
+        scoring; probabilities are only known for customers that ran
+        through every stage. No cache, shadow scoring, churn factors or
+        days-until-churn are involved.
         
-        if features.get('contract_months_remaining', 12) < 3:
-            factors.append("Contract ending soon")
+        Args:
+            columns: Mapping of input field name to its per-row values
+            
+        Returns:
+            Dictionary of churn_risk_category, stages_used and
+            churn_probability (NaN where scoring stopped early) arrays,
+            in row order, plus total_stages, the number of boosting stages
+        """
+        if not self.is_loaded:
+            self.load_model()
+        ensemble = self._tree_ensemble()
+        n_rows = len(next(iter(columns.values()), []))
+        if n_rows == 0:
+            return {
+                "churn_risk_category": np.empty(0, dtype=object),
+                "stages_used": np.empty(0, dtype=np.int32),
+                "churn_probability": np.empty(0, dtype=np.float64),
+                "total_stages": ensemble.n_trees
+            }
         
-        if features.get('avg_days_inactive', 0) > 7:
-            factors.append("Extended inactivity period")
+        with STAGE_SECONDS.time(stage="extract"):
+            raw_matrix = self._extract_raw_columns(columns, n_rows)
+        SCORED_BATCH_SIZE.observe(n_rows)
+        with STAGE_SECONDS.time(stage="scale"):
+            model_input = self._model_input(raw_matrix)
+        with STAGE_SECONDS.time(stage="triage"):
+            raw_scores, stages_used, side = ensemble.triage(
+                model_input, _log_odds(MEDIUM_RISK_THRESHOLD), _log_odds(HIGH_RISK_THRESHOLD)
+            )
         
-        return factors[:5] if factors else ["No significant risk factors identified"]
+        completed = side == 0
+        churn_probs = np.full(n_rows, np.nan)
+        churn_probs[completed] = 1.0 / (1.0 + np.exp(-raw_scores[completed]))
+        # Rows that stopped early are certain to be below Medium or at least High
+        risk_categories = np.where(
+            completed, self._get_risk_categories(churn_probs),
+            np.where(side < 0, "Low", "High")
+        ).astype(object)
+        count_predictions(risk_categories)
+        return {
+            "churn_risk_category": risk_categories,
+            "stages_used": stages_used,
+            "churn_probability": churn_probs,
+            "total_stages": ensemble.n_trees
+        }
     
-    def _get_recommended_actions(self, risk_category: str, features: Dict[str, Any]) -> List[str]:
-        """Generate recommended retention actions."""
-        actions = []
+    def predict_cached(self, features: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the cached prediction for a customer, or None without scoring."""
+        if self.cache is None or not self.is_loaded:
+            return None
+        key = PredictionCache.make_key(self._normalize(self._extract_raw_matrix([features]))[0], self.model_version)
+        cached = self.cache.get_many([key], count_misses=False)[0]
+        if cached is None:
+            return None
+        return {"customer_id": features.get("customer_id", "unknown"), **cached}
+    
+    def _score_batch(self, raw_matrix: np.ndarray, customer_ids: List[Any]) -> List[Dict[str, Any]]:
+        """Score a raw feature matrix, serving unchanged customers from the cache."""
+        if self.cache is None:
+            results = self._score_rows(raw_matrix, customer_ids)
+            count_predictions([result["churn_risk_category"] for result in results])
+            return results
         
-        if risk_category == "High":
-            actions.append("Immediate retention call from specialized agent")
-            
-            if features.get('avg_signal_strength', -70) < -85:
-                actions.append("Offer network issue compensation (PROMO-006)")
-                actions.append("Schedule network assessment for customer location")
-            
-            actions.append("Offer Win-Back Special (PROMO-002) - 3 free months")
-            actions.append("Escalate to retention specialist")
-            
-        elif risk_category == "Medium":
-            actions.append("Proactive customer outreach within 7 days")
-            
-            if features.get('avg_data_usage_pct', 100) < 30:
-                actions.append("Offer Data Boost Upgrade (PROMO-003)")
-            
-            actions.append("Offer Loyalty Reward 20% discount (PROMO-001)")
-            actions.append("Send personalized engagement campaign")
-            
+        with STAGE_SECONDS.time(stage="cache"):
+            feature_matrix = self._normalize(raw_matrix)
+            keys = [PredictionCache.make_key(row, self.model_version) for row in feature_matrix]
+            cached = self.cache.get_many(keys)
+        misses = [i for i, value in enumerate(cached) if value is None]
+        
+        if len(misses) == len(keys):
+            results = self._score_rows(raw_matrix, customer_ids)
+            self.cache.put_many(keys, [self._cacheable(result) for result in results])
         else:
-            actions.append("Continue regular monitoring")
-            actions.append("Include in loyalty program communications")
-            actions.append("Offer referral incentives")
+            if misses:
+                scored = self._score_rows(raw_matrix[misses], [customer_ids[i] for i in misses])
+                self.cache.put_many([keys[i] for i in misses], [self._cacheable(result) for result in scored])
+                for i, result in zip(misses, scored):
+                    cached[i] = result
+            results = [
+                value if "customer_id" in value else {"customer_id": customer_ids[i], **value}
+                for i, value in enumerate(cached)
+            ]
         
-        if features.get('customer_segment') == 'Premium':
-            actions.append("Consider Premium Device Deal (PROMO-004)")
+        count_predictions([result["churn_risk_category"] for result in results])
+        return results
+    
+    @staticmethod
+    def _cacheable(result: Dict[str, Any]) -> Dict[str, Any]:
+        """A prediction without its customer_id, as stored in the cache."""
+        return {k: v for k, v in result.items() if k != "customer_id"}
+    
+    def _score_rows(self, raw_matrix: np.ndarray, customer_ids: List[Any]) -> List[Dict[str, Any]]:
+        """Score a raw feature matrix and build per-customer results."""
+        SCORED_BATCH_SIZE.observe(len(customer_ids))
+        with STAGE_SECONDS.time(stage="scale"):
+            model_input = self._model_input(raw_matrix)
+        
+        with STAGE_SECONDS.time(stage="predict_proba"):
+            churn_probs = self._predict_proba(model_input)
+        
+        contributions = None
+        if self.feature_contributions:
+            with STAGE_SECONDS.time(stage="contributions"):
+                contributions = self._contributions(model_input)
+        
+        with STAGE_SECONDS.time(stage="rules"):
+            risk_categories = self._get_risk_categories(churn_probs)
+            confidence_scores = np.maximum(churn_probs, 1 - churn_probs)
+            top_factors = self.rules.top_churn_factors(raw_matrix)
+            recommended_actions = self.rules.recommended_actions(raw_matrix, risk_categories)
+            days_until_churn = self.rules.days_until_churn(raw_matrix, churn_probs)
         
-        return actions
+        if self.shadow is not None:
+            self.shadow.submit(raw_matrix, churn_probs, risk_categories)
+        
+        with STAGE_SECONDS.time(stage="build_results"):
+            return self._build_results(
+                customer_ids, churn_probs, risk_categories, confidence_scores,
+                top_factors, recommended_actions, days_until_churn, contributions
+            )
+    
+    def _build_results(self, customer_ids: List[Any], churn_probs: np.ndarray, risk_categories: np.ndarray,
+                       confidence_scores: np.ndarray, top_factors: List[List[str]],
+                       recommended_actions: List[List[str]], days_until_churn: np.ndarray,
+                       contributions: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Assemble per-customer prediction dictionaries from the batch arrays."""
+        timestamp = datetime.utcnow().isoformat()
+        results = [
+            {
+                "customer_id": customer_ids[i],
+                "churn_probability": round(float(churn_probs[i]), 4),
+                "churn_risk_category": risk_categories[i],
+                "top_churn_factors": top_factors[i],
+                "recommended_actions": recommended_actions[i],
+                "model_version": self.model_version,
+                "confidence_score": round(float(confidence_scores[i]), 4),
+                "days_until_likely_churn": int(days_until_churn[i]),
+                "prediction_timestamp": timestamp
+            }
+            for i in range(len(customer_ids))
+        ]
+        if contributions is not None:
+            for result, row in zip(results, np.round(contributions, 4).tolist()):
+                result["feature_contributions"] = dict(zip(self.feature_names, row))
+        return results
     
-    def _estimate_days_until_churn(self, probability: float, features: Dict[str, Any]) -> int:
-        """Estimate days until likely churn based on probability and features."""
-        base_days = int((1 - probability) * 180)
+    def _contributions(self, model_input: np.ndarray) -> np.ndarray:
+        """Per-feature contributions to the churn log-odds for _model_input rows."""
+        return self._tree_ensemble().contributions(model_input)
+    
+    def model_digest(self) -> str:
+        """
+        Short sha256 of the loaded model's trees and scaler.
+        
+        model_version is only a label; the digest changes whenever the model
+        content does, e.g. a model retrained or swapped under the same
+        version. sklearn models too deep to compile are hashed from their
+        pickle.
+        """
+        if self._model_digest is None:
+            if not self.is_loaded:
+                self.load_model()
+            digest = hashlib.sha256()
+            ensemble = self.compiled_model or self._compiled_copy
+            if ensemble is None:
+                try:
+                    ensemble = self._compiled_copy = CompiledTreeEnsemble.from_sklearn(self.model)
+                except ValueError:
+                    digest.update(pickle.dumps(self.model))
+            if ensemble is not None:
+                for array in (ensemble.feature, ensemble.threshold, ensemble.leaf_value):
+                    digest.update(np.ascontiguousarray(array).tobytes())
+                digest.update(f"{ensemble.base_score!r}:{ensemble.input_dtype}".encode("utf-8"))
+            for array in (self.scaler.mean_, self.scaler.scale_):
+                digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+            self._model_digest = digest.hexdigest()[:16]
+        return self._model_digest
+    
+    def _tree_ensemble(self) -> CompiledTreeEnsemble:
+        """
+        The compiled ensemble that scores _model_input rows.
         
-        if features.get('contract_months_remaining', 12) < 3:
-            base_days = min(base_days, features.get('contract_months_remaining', 3) * 30)
+        That is the fused ensemble when preprocessing is fused, else the
+        compiled model, or a compiled copy of the sklearn model built on
+        first use.
+        """
+        if self._fused_model is not None:
+            return self._fused_model
+        if self.compiled_model is not None:
+            return self.compiled_model
+        if self._compiled_copy is None:
+            self._compiled_copy = CompiledTreeEnsemble.from_sklearn(self.model)
+        return self._compiled_copy
+    
+    def _model_input(self, raw_matrix: np.ndarray) -> np.ndarray:
+        """Rows as the scoring model takes them: raw when preprocessing is fused, else normalised and scaled."""
+        if self._fused_model is not None:
+            return raw_matrix
+        return self.scaler.transform(self._normalize(raw_matrix))
+    
+    def _predict_proba(self, model_input: np.ndarray) -> np.ndarray:
+        """Churn (class 1) probability for each _model_input row."""
+        if self._fused_model is not None:
+            return self._fused_model.predict_proba(model_input)[:, 1]
+        if self.compiled_model is not None:
+            return self.compiled_model.predict_proba(model_input)[:, 1]
+        return self.model.predict_proba(model_input)[:, 1]
+    
+    def _extract_raw_matrix(self, customers: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Stack the raw input values of a batch into an (n_customers, n_features) matrix.
         
-        if features.get('negative_sentiment_count', 0) > 2:
-            base_days = int(base_days * 0.7)
+        Missing fields take their FEATURE_INPUTS default; customer_segment
+        becomes the 0/1 is_premium_segment flag.
+        """
+        segment_column = self.feature_names.index('is_premium_segment')
+        rows = []
+        for features in customers:
+            row = [features.get(name, default) for name, default, _, _ in FEATURE_INPUTS]
+            row[segment_column] = 1 if row[segment_column] == 'Premium' else 0
+            rows.append(row)
+        return np.array(rows, dtype=np.float64).reshape(len(customers), len(FEATURE_INPUTS))
+    
+    def _extract_raw_columns(self, columns: Dict[str, Sequence[Any]], n_rows: int) -> np.ndarray:
+        """
+        Column-wise counterpart of _extract_raw_matrix; None values take the default.
         
-        return max(7, min(365, base_days))
+        Numeric NumPy columns are converted without a Python loop, with NaN
+        treated as missing.
+        """
+        raw = np.empty((n_rows, len(FEATURE_INPUTS)), dtype=np.float64)
+        for j, (name, default, _, _) in enumerate(FEATURE_INPUTS):
+            values = columns.get(name)
+            if name == 'customer_segment':
+                if values is None:
+                    raw[:, j] = 0
+                elif isinstance(values, np.ndarray):
+                    raw[:, j] = values == 'Premium'
+                else:
+                    raw[:, j] = [v == 'Premium' for v in values]
+            elif values is None:
+                raw[:, j] = default
+            elif isinstance(values, np.ndarray) and values.dtype.kind in 'fiub':
+                values = values.astype(np.float64, copy=False)
+                raw[:, j] = np.where(np.isnan(values), default, values)
+            else:
+                raw[:, j] = [default if v is None else v for v in values]
+        return raw
+    
+    def _normalize(self, raw_matrix: np.ndarray) -> np.ndarray:
+        """Apply the _extract_features normalisation to a raw feature matrix."""
+        return (raw_matrix + FEATURE_OFFSETS) / FEATURE_DIVISORS
+    
+    def _extract_features(self, features: Dict[str, Any]) -> List[float]:
+        """Extract feature vector from customer data."""
+        return self._normalize(self._extract_raw_matrix([features]))[0].tolist()
+    
+    def _get_risk_category(self, probability: float) -> str:
+        """Categorize churn risk based on probability."""
+        if probability >= HIGH_RISK_THRESHOLD:
+            return "High"
+        elif probability >= MEDIUM_RISK_THRESHOLD:
+            return "Medium"
+        return "Low"
+    
+    def _get_risk_categories(self, probabilities: np.ndarray) -> np.ndarray:
+        """Categorize churn risk for an array of probabilities."""
+        return np.where(
+            probabilities >= HIGH_RISK_THRESHOLD, "High",
+            np.where(probabilities >= MEDIUM_RISK_THRESHOLD, "Medium", "Low")
+        ).astype(object)
+
+
+def _log_odds(probability: float) -> float:
+    """Raw model score at which the churn probability equals probability."""
+    return float(np.log(probability / (1 - probability)))
 
 
 def create_model_instance():
-    """Factory function to create and initialize the model."""
+    """
+    Factory function to create and initialize the model.
+    
+    With a model registry configured (CHURN_MODEL_REGISTRY) the registry's
+    current version is loaded instead of CHURN_MODEL_PATH.
+    """
+    if os.environ.get("CHURN_MODEL_REGISTRY"):
+        from model_registry import get_model_registry
+        predictor = get_model_registry().load_live()
+        if predictor is not None:
+            return predictor
     predictor = ChurnPredictor()
     predictor.load_model()
     return predictor
 
 
+def _file_signature(path: str) -> tuple:
+    """Identity of a file version: replaced files get a new inode/mtime."""
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _files_signature(paths: Sequence[str]) -> tuple:
+    """Identities of a set of files loaded together (see _file_signature)."""
+    return tuple(_file_signature(path) for path in paths)
+
+
 MODEL_INSTANCE = None
+_MODEL_LOCK = threading.Lock()
 
 def get_model():
-    """Get or create the singleton model instance."""
+    """
+    Get or create the singleton model instance.
+    
+    When the model was loaded from an artifact that has since been replaced,
+    a fresh instance is built and swapped in; in-flight requests keep using
+    the instance they already hold.
+    """
     global MODEL_INSTANCE
-    if MODEL_INSTANCE is None:
-        MODEL_INSTANCE = create_model_instance()
-    return MODEL_INSTANCE
+    model = MODEL_INSTANCE
+    if model is not None and not model.artifact_changed():
+        return model
+    with _MODEL_LOCK:
+        if MODEL_INSTANCE is model:
+            if model is not None:
+                logger.info("Model artifact changed on disk, reloading")
+            MODEL_INSTANCE = create_model_instance()
+        return MODEL_INSTANCE
+
+
+def set_model(predictor: "ChurnPredictor"):
+    """
+    Atomically replace the live model instance.
+    
+    Requests already holding the previous instance finish on it; every
+    later get_model() call returns the new one.
+    """
+    global MODEL_INSTANCE
+    with _MODEL_LOCK:
+        MODEL_INSTANCE = predictor
 
 
 def predict_churn_handler(features: Dict[str, Any]) -> Dict[str, Any]:
@@ -290,6 +975,48 @@ def predict_batch_handler(customers: List[Dict[str, Any]]) -> List[Dict[str, Any
     return model.predict_batch(customers)
 
 
+def predict_columns_handler(columns: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """
+    Handler function for column-oriented batch prediction.
+    
+    Args:
+        columns: Mapping of input field name to its per-row values
+        
+    Returns:
+        List of prediction result dictionaries, in row order
+    """
+    model = get_model()
+    return model.predict_columns(columns)
+
+
+def predict_arrays_handler(columns: Dict[str, Sequence[Any]]) -> Dict[str, np.ndarray]:
+    """
+    Handler function for columnar (Arrow) batch prediction.
+    
+    Args:
+        columns: Mapping of input field name to its per-row values
+        
+    Returns:
+        Dictionary of per-row result arrays
+    """
+    model = get_model()
+    return model.predict_arrays(columns)
+
+
+def triage_columns_handler(columns: Dict[str, Sequence[Any]]) -> Dict[str, Any]:
+    """
+    Handler function for early-exit triage scoring.
+    
+    Args:
+        columns: Mapping of input field name to its per-row values
+        
+    Returns:
+        Dictionary of per-row triage result arrays and total_stages
+    """
+    model = get_model()
+    return model.triage_columns(columns)
+
+
 if __name__ == "__main__":
     test_customer = {
         "customer_id": "CUST-000001",
@@ -194,7 +194,7 @@ print_next_steps() {
     echo "        memory: 2Gi"
     echo "        cpu: 1"
     echo "    readinessProbe:"
-    echo "      path: /health"
+    echo "      path: /ready"
     echo "      port: 8000"
     echo "  endpoints:"
     echo "  - name: predict"
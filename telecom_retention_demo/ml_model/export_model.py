@@ -0,0 +1,80 @@
+"""
+Convert a trained churn model into a compiled .npz artifact
+
+Reads churn_model.joblib (plus its _scaler.joblib companion), flattens the
+gradient boosting ensemble and scaler with tree_engine, checks that the
+compiled model reproduces sklearn's probabilities and writes one .npz file
+that ChurnPredictor.load_model can read without importing sklearn.
+
+The artifact is written and verified under a temporary name next to the
+output and only then moved into place, so running services (which reload
+a replaced artifact) never see one that failed verification.
+
+Usage:
+    python export_model.py --model /app/model/churn_model.joblib
+    python export_model.py --model churn_model.joblib --output churn_model.npz
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+import numpy as np
+
+from churn_predictor import ChurnPredictor
+from tree_engine import load_artifact
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def verify_artifact(predictor: ChurnPredictor, path: str, n_samples: int = 10000) -> float:
+    """Return the max probability difference between sklearn and the artifact."""
+    ensemble, scaler, _ = load_artifact(path)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n_samples, len(predictor.feature_names)))
+    expected = predictor.model.predict_proba(predictor.scaler.transform(X))[:, 1]
+    actual = ensemble.predict_proba(scaler.transform(X))[:, 1]
+    return float(np.abs(expected - actual).max())
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export a churn model to a compiled .npz artifact")
+    parser.add_argument("--model", default="/app/model/churn_model.joblib",
+                        help="Path of the trained churn_model.joblib")
+    parser.add_argument("--output", default=None,
+                        help="Artifact path (default: model path with .npz extension)")
+    parser.add_argument("--tolerance", type=float, default=1e-9,
+                        help="Max allowed probability difference against sklearn")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model):
+        logger.error(f"Model not found: {args.model}")
+        return 1
+
+    predictor = ChurnPredictor(model_path=args.model, engine="sklearn")
+    try:
+        predictor.load_model(fallback=False)
+    except Exception as e:
+        logger.error(f"Could not load model from {args.model}: {e}")
+        return 1
+
+    output = args.output or predictor.artifact_path
+    tmp_path = f"{output}.unverified-{os.getpid()}"
+    try:
+        predictor.export_artifact(tmp_path)
+        max_diff = verify_artifact(predictor, tmp_path)
+        if max_diff > args.tolerance:
+            logger.error(f"Artifact verification failed: max probability difference {max_diff:.3g}")
+            return 1
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"Artifact verified (max probability difference {max_diff:.3g}) and written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
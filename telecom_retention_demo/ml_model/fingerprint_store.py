@@ -0,0 +1,327 @@
+"""
+On-disk fingerprint store for delta scoring
+
+Most customers' aggregate features are identical from one daily scoring
+run to the next. The store remembers, per customer_id, a fingerprint of
+the normalised model feature vector (the _extract_features vector) and
+the prediction last written for it, so a bulk run only scores new or
+changed customers and copies the stored prediction for everyone else.
+
+Layout of the store directory:
+- index.npz: one entry per customer, sorted by key (64-bit hash of the
+  customer_id): the fingerprint (128-bit hash of customer_id and feature
+  vector) and the offset and length of the customer's last prediction
+  line in the data file, plus metadata (signature, data file). Readers
+  memory-map it; the writer replaces it atomically.
+- predictions-<generation>.dat: append-only prediction lines. Lines of
+  re-scored customers stay behind as garbage until compaction rewrites
+  the live lines into a new generation.
+
+There is one writer at a time (the batch scoring main process). New
+entries are appended to the data file during a run and enter the index
+when the run commits. After a crash the index still points at the
+previous, consistent entries; those customers are just scored again.
+
+Stored predictions are only valid for the signature they were made
+under (model version, churn rules, output options). A store opened with
+a different signature is invalidated completely.
+"""
+
+import json
+import logging
+import mmap
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tree_engine import mmap_npz
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of index.npz changes
+STORE_FORMAT_VERSION = 1
+
+# Rewrite the data file at commit once less than this fraction of it is live
+COMPACT_LIVE_FRACTION = 0.5
+
+# Entries copied per write when the data file is rewritten
+COMPACT_CHUNK_ENTRIES = 100000
+
+# (keys, fingerprints, prediction lines) of newly scored customers
+StoreUpdate = Tuple[np.ndarray, np.ndarray, List[bytes]]
+
+# Seeds of the independent hash lanes: store key, then the two fingerprint halves
+HASH_SEEDS = (0x9E3779B97F4A7C15, 0xD1B54A32D192ED03, 0x8CB92BA72F3D8DD7)
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: a bijective scramble of 64-bit words."""
+    h = (h ^ (h >> 30)) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> 27)) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> 31)
+
+
+def _hash_words(words: np.ndarray, n_words: np.ndarray, seed: Any) -> np.ndarray:
+    """Hash the first n_words[i] uint64 words of every row i of words, shape (n, width)."""
+    h = np.broadcast_to(np.asarray(seed, dtype=np.uint64), (words.shape[0],)).copy()
+    for j in range(words.shape[1]):
+        h = np.where(j < n_words, _mix(h ^ words[:, j]), h)
+    return _mix(h ^ n_words.astype(np.uint64))
+
+
+def _id_hashes(customer_ids: Sequence[str]) -> List[np.ndarray]:
+    """One 64-bit hash of every customer_id per HASH_SEEDS lane."""
+    ids = np.asarray(customer_ids, dtype=str).reshape(-1)
+    width = max(ids.dtype.itemsize // 4, 1)
+    # UTF-32 code points, zero-padded to whole 64-bit words
+    words = ids.astype(f"<U{width + width % 2}").view(np.uint64).reshape(len(ids), -1)
+    n_words = (np.char.str_len(ids) + 1) // 2
+    return [_hash_words(words, n_words, seed) for seed in HASH_SEEDS]
+
+
+def customer_keys(customer_ids: Sequence[str]) -> np.ndarray:
+    """64-bit store key of each customer_id."""
+    if len(customer_ids) == 0:
+        return np.empty(0, dtype=np.uint64)
+    return _id_hashes(customer_ids)[0]
+
+
+def fingerprint_rows(customer_ids: Sequence[str], feature_matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Store keys and 128-bit fingerprints, shape (n, 2), of customers and their normalised features.
+
+    Both fingerprint halves cover the customer_id and every feature, each
+    from an independent seed, so a stored prediction is only reused for the
+    same customer with float64-identical features (-0.0 and 0.0 count as
+    equal). This is a fast non-cryptographic hash (splitmix64 rounds over
+    the raw 64-bit words), vectorised over the batch.
+    """
+    if len(customer_ids) == 0:
+        return np.empty(0, dtype=np.uint64), np.empty((0, 2), dtype=np.uint64)
+    keys, seed_low, seed_high = _id_hashes(customer_ids)
+    words = (np.ascontiguousarray(feature_matrix, dtype=np.float64) + 0.0).view(np.uint64)
+    n_words = np.full(len(words), words.shape[1])
+    fingerprints = np.column_stack([_hash_words(words, n_words, seed_low), _hash_words(words, n_words, seed_high)])
+    return keys, fingerprints
+
+
+class FingerprintStore:
+    """
+    Persistent customer_id -> (feature fingerprint, last prediction line) map.
+
+    Args:
+        path: Store directory, created if missing
+        read_only: Open for lookups only (worker processes)
+    """
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.index_path = os.path.join(path, "index.npz")
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self._updates: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        self._seen: Optional[List[np.ndarray]] = None
+        self._writer = None
+        self._load()
+
+    def _load(self):
+        """Map the current index and data file."""
+        if os.path.exists(self.index_path):
+            arrays = mmap_npz(self.index_path)
+            self.meta = json.loads(arrays["metadata"].tobytes().decode("utf-8"))
+            if self.meta.get("format_version") != STORE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported fingerprint store format: {self.meta.get('format_version')}")
+            self.keys = arrays["key"]
+            self.fingerprints = arrays["fingerprint"]
+            self.offsets = arrays["offset"]
+            self.lengths = arrays["length"]
+        else:
+            self.meta = {"format_version": STORE_FORMAT_VERSION, "signature": None, "generation": 0}
+            self.keys = np.empty(0, dtype=np.uint64)
+            self.fingerprints = np.empty((0, 2), dtype=np.uint64)
+            self.offsets = np.empty(0, dtype=np.int64)
+            self.lengths = np.empty(0, dtype=np.int64)
+        self._data = self._map_data(self.data_path)
+
+    @staticmethod
+    def _map_data(path: str) -> Any:
+        """Read-only map of a data file (empty bytes for a missing or empty file)."""
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return b""
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def data_path(self) -> str:
+        """Data file of the current generation."""
+        return os.path.join(self.path, f"predictions-{self.meta['generation']}.dat")
+
+    @property
+    def signature(self) -> Optional[Dict[str, Any]]:
+        """Signature the stored predictions were made under, or None for a new store."""
+        return self.meta.get("signature")
+
+    def check_signature(self, signature: Dict[str, Any]) -> bool:
+        """
+        Make signature the store's signature.
+
+        Returns:
+            True if the stored predictions remain valid; False if the
+            signature changed and every entry was dropped
+        """
+        current = self.signature
+        if current == signature:
+            return True
+        if current is not None:
+            logger.info(f"Fingerprint store signature changed ({current} -> {signature}); invalidating")
+        old_data_path = self.data_path
+        self.meta = {"format_version": STORE_FORMAT_VERSION, "signature": signature,
+                     "generation": self.meta["generation"] + 1}
+        empty = np.empty(0, dtype=np.int64)
+        self._write_index(empty.astype(np.uint64), np.empty((0, 2), dtype=np.uint64), empty, empty)
+        if os.path.exists(old_data_path):
+            os.remove(old_data_path)
+        return current is None
+
+    def match(self, keys: np.ndarray, fingerprints: np.ndarray) -> np.ndarray:
+        """
+        Index entry of every customer whose stored fingerprint matches, else -1.
+
+        Args:
+            keys: Store keys of the customers (fingerprint_rows)
+            fingerprints: Fingerprints of the customers (fingerprint_rows)
+        """
+        if len(self.keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        position = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        hit = (self.keys[position] == keys) & (self.fingerprints[position] == fingerprints).all(axis=1)
+        return np.where(hit, position, -1)
+
+    def predictions(self, entries: np.ndarray) -> List[bytes]:
+        """Stored prediction lines of index entries (from match)."""
+        data = self._data
+        return [data[offset:offset + length]
+                for offset, length in zip(self.offsets[entries].tolist(), self.lengths[entries].tolist())]
+
+    def append(self, keys: np.ndarray, fingerprints: np.ndarray, lines: List[bytes]):
+        """Append newly scored customers to the data file; they enter the index at commit()."""
+        if self._writer is None:
+            self._writer = open(self.data_path, "ab")
+        start = self._writer.tell()
+        lengths = np.fromiter(map(len, lines), dtype=np.int64, count=len(lines))
+        self._writer.write(b"".join(lines))
+        self._updates.append((keys, fingerprints, start + np.cumsum(lengths) - lengths, lengths))
+
+    def begin_sweep(self):
+        """Start recording the customers of a run; commit() then drops everyone else."""
+        self._seen = []
+
+    def mark_seen(self, keys: np.ndarray):
+        """Record customer keys present in the current run (after begin_sweep)."""
+        if self._seen is not None:
+            self._seen.append(keys)
+
+    def commit(self, compact: bool = False) -> Dict[str, Any]:
+        """
+        Merge the appended entries into the index.
+
+        The latest entry per customer wins. With an active sweep, customers
+        not seen in the run are dropped. The data file is rewritten when
+        compact is set or less than COMPACT_LIVE_FRACTION of it is live.
+
+        Returns:
+            Entries, removed customers and whether the data file was compacted
+        """
+        if self._updates:
+            keys, fingerprints, offsets, lengths = (np.concatenate(parts) for parts in zip(*self._updates))
+            _, last = np.unique(keys[::-1], return_index=True)
+            latest = len(keys) - 1 - last
+            keys, fingerprints, offsets, lengths = keys[latest], fingerprints[latest], offsets[latest], lengths[latest]
+        else:
+            keys = np.empty(0, dtype=np.uint64)
+            fingerprints = np.empty((0, 2), dtype=np.uint64)
+            offsets = lengths = np.empty(0, dtype=np.int64)
+
+        keep = ~np.isin(self.keys, keys)
+        removed = 0
+        if self._seen is not None:
+            seen = np.isin(self.keys, np.concatenate(self._seen)) if self._seen else np.zeros(len(self.keys), bool)
+            removed = int((keep & ~seen).sum())
+            keep &= seen
+            self._seen = None
+
+        keys = np.concatenate([self.keys[keep], keys])
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        fingerprints = np.concatenate([self.fingerprints[keep], fingerprints])[order]
+        offsets = np.concatenate([self.offsets[keep], offsets])[order]
+        lengths = np.concatenate([self.lengths[keep], lengths])[order]
+
+        if self._writer is not None:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self._writer.close()
+            self._writer = None
+        self._updates = []
+
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        compacted = compact or int(lengths.sum()) < COMPACT_LIVE_FRACTION * data_size
+        old_data_path = self.data_path
+        if compacted:
+            offsets = self._rewrite_data(offsets, lengths)
+        self._write_index(keys, fingerprints, offsets, lengths)
+        if compacted and os.path.exists(old_data_path):
+            os.remove(old_data_path)
+        return {"entries": len(keys), "removed": removed, "compacted": compacted}
+
+    def _rewrite_data(self, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """Copy the live lines into the next generation's data file; returns their new offsets."""
+        source = self._map_data(self.data_path)
+        self.meta["generation"] += 1
+        with open(self.data_path, "wb") as f:
+            for start in range(0, len(offsets), COMPACT_CHUNK_ENTRIES):
+                stop = start + COMPACT_CHUNK_ENTRIES
+                f.write(b"".join(source[offset:offset + length] for offset, length
+                                 in zip(offsets[start:stop].tolist(), lengths[start:stop].tolist())))
+            f.flush()
+            os.fsync(f.fileno())
+        if isinstance(source, mmap.mmap):
+            source.close()
+        return np.cumsum(lengths) - lengths
+
+    def _write_index(self, keys: np.ndarray, fingerprints: np.ndarray, offsets: np.ndarray, lengths: np.ndarray):
+        """Write index.npz next to its destination, move it into place and map it."""
+        tmp_path = f"{self.index_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                key=keys.astype(np.uint64),
+                fingerprint=fingerprints.astype(np.uint64),
+                offset=offsets.astype(np.int64),
+                length=lengths.astype(np.int64),
+                metadata=np.frombuffer(json.dumps(self.meta).encode("utf-8"), dtype=np.uint8)
+            )
+        os.replace(tmp_path, self.index_path)
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._load()
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, live and total data bytes, and signature."""
+        return {
+            "entries": len(self.keys),
+            "live_bytes": int(self.lengths.sum()),
+            "data_bytes": os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0,
+            "signature": self.signature
+        }
+
+    def close(self):
+        """Close the data file handles; uncommitted entries are discarded."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
@@ -0,0 +1,135 @@
+"""
+Inference execution layer for the Churn Prediction API
+
+Runs CPU-bound model scoring on a thread or process pool so the asyncio
+event loop stays free for /health and other requests. The number of
+in-flight jobs is bounded; once the pool is saturated new work is rejected
+immediately so callers can back off instead of queueing without limit.
+
+Configuration (environment variables):
+- INFERENCE_EXECUTOR: "thread" (default) or "process"
+- INFERENCE_WORKERS: number of pool workers (default: CPU count)
+- INFERENCE_MAX_PENDING: max running + queued jobs (default: 4 x workers)
+- INFERENCE_RETRY_AFTER_SECS: Retry-After hint returned when saturated (default: 1)
+"""
+
+import os
+import asyncio
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from metrics import INFERENCE_REJECTIONS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the inference pool has no free capacity for new work."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference pool saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _warm_worker():
+    """Load the model once in each worker process and follow the model registry, if any."""
+    from churn_predictor import get_model
+    get_model()
+    if os.environ.get("CHURN_MODEL_REGISTRY"):
+        from model_registry import get_model_registry
+        get_model_registry().start_watcher()
+
+
+class InferencePool:
+    """
+    Bounded thread/process pool for model inference.
+
+    Jobs are admitted only while fewer than max_pending are running or
+    queued; beyond that run() raises PoolSaturatedError.
+    """
+
+    def __init__(self, mode: str = "thread", max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, retry_after: int = 1):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.retry_after = retry_after
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    @classmethod
+    def from_env(cls) -> "InferencePool":
+        """Create a pool configured from INFERENCE_* environment variables."""
+        workers = os.environ.get("INFERENCE_WORKERS")
+        pending = os.environ.get("INFERENCE_MAX_PENDING")
+        return cls(
+            mode=os.environ.get("INFERENCE_EXECUTOR", "thread").lower(),
+            max_workers=int(workers) if workers else None,
+            max_pending=int(pending) if pending else None,
+            retry_after=int(os.environ.get("INFERENCE_RETRY_AFTER_SECS", "1"))
+        )
+
+    @property
+    def executor(self) -> Executor:
+        """Lazily create the underlying executor."""
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_warm_worker
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="inference"
+                )
+            logger.info(
+                f"Inference pool started: mode={self.mode}, workers={self.max_workers}, "
+                f"max_pending={self.max_pending}"
+            )
+        return self._executor
+
+    @property
+    def saturated(self) -> bool:
+        """True when no further jobs can be admitted."""
+        return self.pending >= self.max_pending
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run func(*args) on the pool and await its result.
+
+        In process mode func and args must be picklable (module-level
+        handlers such as predict_batch_handler).
+
+        Raises:
+            PoolSaturatedError: If max_pending jobs are already in flight
+        """
+        if self.saturated:
+            INFERENCE_REJECTIONS.inc()
+            raise PoolSaturatedError(self.retry_after)
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        """Current pool configuration and load."""
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending
+        }
+
+    def shutdown(self):
+        """Stop the pool, waiting for running jobs to finish."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,369 @@
+"""
+Priority lanes for model scoring on the inference pool
+
+Agent-driven single-customer calls (GET_CHURN_PREDICTION), warehouse
+service function batches (PREDICT_CHURN) and bulk uploads share one
+inference pool. The scheduler keeps one queue per lane and hands pool
+slots (one per pool worker) to the highest-priority lane with work
+waiting, so a slot freed by a bulk job goes to a waiting interactive call
+first:
+
+- interactive: single-customer /predict calls (micro-batched)
+- warehouse: multi-row Snowflake service function calls
+- bulk: /predict/batch, /predict/triage, /predict/stream and /predict/arrow
+
+Large column/list payloads are split into slices of at most slice_rows
+rows, each a separate pool job, so an interactive call waits for at most
+one slice rather than a whole bulk batch. Each lane also has a concurrency
+limit (slots it may hold at once) and a queue limit (requests queued or
+in progress).
+
+Admission is deadline-aware: a lane with a deadline rejects a request up
+front when its estimated queue wait plus service time (from the recent
+slice durations, timed in the pool workers) already exceeds the deadline,
+so the caller can fall back at once instead of waiting for a late answer.
+Rejections raise LaneRejectedError, a PoolSaturatedError, so callers
+return 503 with Retry-After as for a saturated pool. The remaining slices
+of a cancelled request (e.g. the client disconnected) are skipped.
+
+Configuration (environment variables, <LANE> is INTERACTIVE, WAREHOUSE or BULK):
+- LANE_<LANE>_CONCURRENCY: max pool slots held by the lane
+  (default: all workers for interactive, workers - 1 for warehouse,
+  workers / 2 for bulk; at least 1)
+- LANE_<LANE>_MAX_QUEUE: max requests queued or in progress in the lane
+  (default: INFERENCE_MAX_PENDING)
+- LANE_<LANE>_DEADLINE_MS: admission deadline, 0 for none
+  (default: 100 interactive, 30000 warehouse, 0 bulk)
+- LANE_<LANE>_SLICE_ROWS: rows per slice, 0 for no slicing
+  (default: 0 interactive, 2000 warehouse and bulk)
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from inference_pool import InferencePool, PoolSaturatedError
+from metrics import INFERENCE_REJECTIONS, LANE_REJECTIONS, LANE_REQUEST_SECONDS, LANE_WAIT_SECONDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Lanes in priority order, highest first
+LANES = ("interactive", "warehouse", "bulk")
+
+# Weight of the latest slice in a lane's running service-time estimate
+ESTIMATE_SMOOTHING = 0.2
+
+# Recent request latencies kept per lane for the stats percentiles
+LATENCY_WINDOW = 1000
+
+
+class LaneRejectedError(PoolSaturatedError):
+    """Raised when a lane turns a request away (queue full or deadline unreachable)."""
+
+    def __init__(self, lane: str, reason: str, retry_after: int):
+        super().__init__(retry_after)
+        self.args = (f"Lane {lane} rejected request ({reason}), retry after {retry_after}s",)
+        self.lane = lane
+        self.reason = reason
+
+
+class Lane:
+    """Configuration, queue and counters of one priority lane."""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int,
+                 deadline_ms: float = 0.0, slice_rows: int = 0):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(1, max_queue)
+        self.deadline_ms = max(0.0, deadline_ms)
+        self.slice_rows = max(0, slice_rows)
+        self.queue: Deque["_Slice"] = deque()
+        self.running = 0
+        self.waiting_requests = 0
+        self.completed = 0
+        self.rejected: Dict[str, int] = {}
+        self.slice_secs: Optional[float] = None
+        self.slice_size: Optional[float] = None
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def estimate(self, rows: Optional[int]) -> float:
+        """Expected service time of a slice: the recent average, scaled up for larger-than-usual slices."""
+        if self.slice_secs is None:
+            return 0.0
+        if rows is None:
+            return self.slice_secs
+        return self.slice_secs * max(1.0, rows / self.slice_size)
+
+    def record(self, rows: int, seconds: float):
+        """Fold a finished slice into the service-time estimate."""
+        if self.slice_secs is None:
+            self.slice_secs, self.slice_size = seconds, float(max(rows, 1))
+            return
+        self.slice_secs += ESTIMATE_SMOOTHING * (seconds - self.slice_secs)
+        self.slice_size += ESTIMATE_SMOOTHING * (max(rows, 1) - self.slice_size)
+
+
+class _Request:
+    """One caller's request: its slices fail together."""
+
+    def __init__(self, lane: Lane):
+        self.lane = lane
+        self.failed = False
+
+
+class _Slice:
+    """One pool job: a slice of a request's payload."""
+
+    def __init__(self, request: _Request, func: Callable[..., Any], payload: Any,
+                 rows: Optional[int], future: asyncio.Future):
+        self.request = request
+        self.func = func
+        self.payload = payload
+        self.rows = rows
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.started_at = 0.0
+
+
+class LaneScheduler:
+    """
+    Dispatches scoring jobs from per-lane queues onto an InferencePool.
+
+    At most pool.max_workers jobs run at once, so waiting work stays in the
+    lane queues, where priority applies, rather than in the pool's FIFO.
+    """
+
+    def __init__(self, pool: InferencePool, lanes: List[Lane]):
+        self.pool = pool
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.slots = max(1, min(pool.max_workers, pool.max_pending))
+        self._running: Set[_Slice] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, pool: InferencePool) -> "LaneScheduler":
+        """Create a scheduler with lanes configured from LANE_* environment variables."""
+        workers = pool.max_workers
+        defaults = {
+            # (concurrency, deadline ms, slice rows)
+            "interactive": (workers, 100, 0),
+            "warehouse": (workers - 1, 30000, 2000),
+            "bulk": (workers // 2, 0, 2000)
+        }
+        lanes = []
+        for name in LANES:
+            concurrency, deadline_ms, slice_rows = defaults[name]
+            prefix = f"LANE_{name.upper()}_"
+            lanes.append(Lane(
+                name,
+                concurrency=int(os.environ.get(prefix + "CONCURRENCY", str(concurrency))),
+                max_queue=int(os.environ.get(prefix + "MAX_QUEUE", str(pool.max_pending))),
+                deadline_ms=float(os.environ.get(prefix + "DEADLINE_MS", str(deadline_ms))),
+                slice_rows=int(os.environ.get(prefix + "SLICE_ROWS", str(slice_rows)))
+            ))
+        return cls(pool, lanes)
+
+    async def run(self, lane_name: str, func: Callable[..., Any], payload: Any) -> Any:
+        """
+        Run func(payload) on the pool through a lane and await the result.
+
+        List payloads and dicts of equal-length columns are scored in slices
+        of the lane's slice_rows; the slice results (lists, or dicts of
+        arrays) are concatenated back in row order. Other payloads run as
+        one job.
+
+        Raises:
+            LaneRejectedError: If the lane's queue is full or its deadline
+                cannot be met
+        """
+        lane = self.lanes[lane_name]
+        rows = _payload_rows(payload)
+        if lane.waiting_requests >= lane.max_queue:
+            raise self._reject(lane, "queue_full")
+
+        if lane.deadline_ms and self._estimated_wait(lane) + lane.estimate(rows) > lane.deadline_ms / 1000:
+            raise self._reject(lane, "deadline")
+
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        request = _Request(lane)
+        slices = []
+        for part, part_rows in _split_payload(payload, rows, lane.slice_rows):
+            slices.append(_Slice(request, func, part, part_rows, loop.create_future()))
+        lane.queue.extend(slices)
+        lane.waiting_requests += 1
+        self._dispatch()
+
+        try:
+            results = []
+            for job in slices:
+                results.append(await job.future)
+        except BaseException:
+            request.failed = True
+            for job in slices:
+                # Mark errors of sibling slices as retrieved; the first one is raised
+                if job.future.done() and not job.future.cancelled():
+                    job.future.exception()
+            raise
+        finally:
+            lane.waiting_requests -= 1
+
+        elapsed = time.monotonic() - start
+        LANE_REQUEST_SECONDS.observe(elapsed, lane=lane.name)
+        lane.latencies.append(elapsed)
+        lane.completed += 1
+        return results[0] if len(results) == 1 else _merge_results(results)
+
+    def _estimated_wait(self, lane: Lane) -> float:
+        """
+        Seconds a new request in lane is expected to wait for a slot.
+
+        The work ahead of it (slices queued in this and higher-priority
+        lanes, plus what is left of the running slices) spread over the
+        pool slots.
+        """
+        priority = LANES.index(lane.name)
+        queued = sum(
+            other.estimate(job.rows)
+            for other in self.lanes.values() if LANES.index(other.name) <= priority
+            for job in other.queue
+        )
+        if queued == 0.0 and self.running < self.slots and lane.running < lane.concurrency:
+            return 0.0
+        now = time.monotonic()
+        remaining = sum(
+            max(0.0, job.request.lane.estimate(job.rows) - (now - job.started_at)) for job in self._running
+        )
+        return (queued + remaining) / self.slots
+
+    @property
+    def running(self) -> int:
+        """Slices currently on the pool."""
+        return len(self._running)
+
+    def _dispatch(self):
+        """Start queued slices, highest-priority lane first, while pool slots are free."""
+        while self.running < self.slots:
+            job = self._next_slice()
+            if job is None:
+                return
+            lane = job.request.lane
+            lane.running += 1
+            self._running.add(job)
+            job.started_at = time.monotonic()
+            LANE_WAIT_SECONDS.observe(job.started_at - job.enqueued_at, lane=lane.name)
+            task = asyncio.ensure_future(self._run_slice(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _next_slice(self) -> Optional[_Slice]:
+        """Pop the next slice of the highest-priority lane with a free slot, skipping failed requests."""
+        for name in LANES:
+            lane = self.lanes[name]
+            if lane.running >= lane.concurrency:
+                continue
+            while lane.queue:
+                job = lane.queue.popleft()
+                if not job.request.failed:
+                    return job
+        return None
+
+    async def _run_slice(self, job: _Slice):
+        """Score one slice on the pool and resolve its future."""
+        lane = job.request.lane
+        try:
+            seconds, result = await self.pool.run(_timed_call, job.func, job.payload)
+        except Exception as e:
+            # A failed request's caller has already been answered
+            if not job.future.done() and not job.request.failed:
+                job.future.set_exception(e)
+        else:
+            lane.record(job.rows or 1, seconds)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            lane.running -= 1
+            self._running.discard(job)
+            self._dispatch()
+
+    def _reject(self, lane: Lane, reason: str) -> LaneRejectedError:
+        """Count a rejection and build its error."""
+        lane.rejected[reason] = lane.rejected.get(reason, 0) + 1
+        LANE_REJECTIONS.inc(lane=lane.name, reason=reason)
+        INFERENCE_REJECTIONS.inc()
+        error = LaneRejectedError(lane.name, reason, self.pool.retry_after)
+        logger.warning(str(error))
+        return error
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-lane configuration, load, counters and recent latency percentiles."""
+        lanes = {}
+        for name in LANES:
+            lane = self.lanes[name]
+            latencies = np.array(lane.latencies) * 1000
+            lanes[name] = {
+                "concurrency": lane.concurrency,
+                "max_queue": lane.max_queue,
+                "deadline_ms": lane.deadline_ms,
+                "slice_rows": lane.slice_rows,
+                "queued_slices": len(lane.queue),
+                "waiting_requests": lane.waiting_requests,
+                "running": lane.running,
+                "completed": lane.completed,
+                "rejected": dict(lane.rejected),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+                "estimated_slice_ms": None if lane.slice_secs is None else round(lane.slice_secs * 1000, 3)
+            }
+        return {"slots": self.slots, "running": self.running, "lanes": lanes}
+
+
+def _timed_call(func: Callable[..., Any], payload: Any) -> Tuple[float, Any]:
+    """Run func(payload) in a pool worker and return (seconds taken, result)."""
+    start = time.perf_counter()
+    result = func(payload)
+    return time.perf_counter() - start, result
+
+
+def _payload_rows(payload: Any) -> Optional[int]:
+    """Rows in a list or column-dict payload; None for anything else."""
+    if isinstance(payload, list):
+        return len(payload)
+    if isinstance(payload, dict) and payload:
+        return len(next(iter(payload.values())))
+    return None
+
+
+def _split_payload(payload: Any, rows: Optional[int], slice_rows: int) -> List[Tuple[Any, Optional[int]]]:
+    """(slice, rows) pairs of at most slice_rows rows; the whole payload when it cannot or need not be split."""
+    if rows is None or not slice_rows or rows <= slice_rows:
+        return [(payload, rows)]
+    parts = []
+    for start in range(0, rows, slice_rows):
+        stop = min(start + slice_rows, rows)
+        if isinstance(payload, list):
+            parts.append((payload[start:stop], stop - start))
+        else:
+            parts.append(({name: values[start:stop] for name, values in payload.items()}, stop - start))
+    return parts
+
+
+def _merge_results(results: List[Any]) -> Any:
+    """Concatenate slice results: lists end to end, dicts per key (arrays concatenated, scalars kept)."""
+    if isinstance(results[0], list):
+        return [item for result in results for item in result]
+    merged = {}
+    for key, value in results[0].items():
+        if isinstance(value, np.ndarray):
+            merged[key] = np.concatenate([result[key] for result in results])
+        elif isinstance(value, list):
+            merged[key] = [item for result in results for item in result[key]]
+        else:
+            merged[key] = value
+    return merged
@@ -0,0 +1,338 @@
+"""
+Prometheus-style metrics for the Churn Prediction API
+
+A small dependency-free registry of counters, gauges and histograms that
+renders the Prometheus text exposition format for GET /metrics.
+
+Recorded:
+- churn_stage_duration_seconds{stage}: time spent per scoring stage
+  (parse, extract, cache, scale, predict_proba, contributions, triage, rules, build_results, serialize)
+- churn_request_batch_size{endpoint}: rows per scoring request
+- churn_scored_batch_size: rows per model call (after cache hits and micro-batching)
+- churn_predictions_total{risk}: predictions served per risk category
+- churn_http_request_duration_seconds{path, status}: end-to-end request latency
+- churn_inference_rejections_total: jobs rejected because the pool or a lane was saturated
+- churn_lane_*: per priority lane request latency, queue wait and rejections (by reason)
+- churn_shadow_*: shadow candidate rows, risk disagreements and probability deltas
+
+Queue depth gauges are registered by the app with callback functions that
+are evaluated at scrape time.
+
+Metrics are per process: with INFERENCE_EXECUTOR=process the model-side
+stages are recorded in the worker processes and do not appear here, and
+each uvicorn worker exposes its own registry.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Upper bounds, in seconds, for stage and request latency histograms
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds, in rows, for batch size histograms
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1000, 2500,
+                      5000, 10000, 25000, 50000, 100000)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the exposition format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Render a {name="value",...} label set."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value the way Prometheus expects."""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class: a named metric family with a fixed set of label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Label values in label_names order."""
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        """Exposition lines for every label set."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """HELP/TYPE header followed by the samples."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        """Add amount to the counter for a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if not values and not self.label_names:
+            values[()] = 0
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(Metric):
+    """Point-in-time value, either set directly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation)
+        self.function = function
+        self.value = 0.0
+
+    def set(self, value: float):
+        """Set the current value."""
+        self.value = value
+
+    def samples(self) -> List[str]:
+        value = self.function() if self.function is not None else self.value
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(Metric):
+    """Cumulative bucketed distribution with sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str):
+        """Record one observation for a label set."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def observe_many(self, values: Sequence[float], **labels: str):
+        """Record a batch of observations for a label set in one update."""
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        key = self._key(labels)
+        counts = np.bincount(np.searchsorted(self.buckets, values, side="left"), minlength=len(self.buckets) + 1)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            for i, count in enumerate(counts.tolist()):
+                series[0][i] += count
+            series[1] += float(values.sum())
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall-clock duration of the enclosed block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        lines = []
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Ordered collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric, replacing any earlier one with the same name."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """The whole registry in Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Content-Type of the text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "churn_stage_duration_seconds",
+    "Time spent in each scoring stage.",
+    ["stage"]
+))
+REQUEST_BATCH_SIZE = REGISTRY.register(Histogram(
+    "churn_request_batch_size",
+    "Customers per scoring request.",
+    ["endpoint"],
+    buckets=BATCH_SIZE_BUCKETS
+))
+SCORED_BATCH_SIZE = REGISTRY.register(Histogram(
+    "churn_scored_batch_size",
+    "Rows per model call, after cache hits and micro-batching.",
+    buckets=BATCH_SIZE_BUCKETS
+))
+PREDICTIONS_TOTAL = REGISTRY.register(Counter(
+    "churn_predictions_total",
+    "Predictions served, by risk category.",
+    ["risk"]
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "churn_http_request_duration_seconds",
+    "End-to-end HTTP request latency.",
+    ["path", "status"]
+))
+INFERENCE_REJECTIONS = REGISTRY.register(Counter(
+    "churn_inference_rejections_total",
+    "Scoring jobs rejected because the inference pool was saturated."
+))
+LANE_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "churn_lane_request_duration_seconds",
+    "Time from admission to the last slice's result, per priority lane.",
+    ["lane"]
+))
+LANE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "churn_lane_wait_seconds",
+    "Time a slice waited in its lane queue for a pool slot.",
+    ["lane"]
+))
+LANE_REJECTIONS = REGISTRY.register(Counter(
+    "churn_lane_rejections_total",
+    "Requests rejected by a priority lane (queue_full, deadline).",
+    ["lane", "reason"]
+))
+SHADOW_ROWS = REGISTRY.register(Counter(
+    "churn_shadow_rows_total",
+    "Rows scored by the shadow candidate model.",
+    ["version"]
+))
+SHADOW_DISAGREEMENTS = REGISTRY.register(Counter(
+    "churn_shadow_risk_disagreements_total",
+    "Shadow rows whose risk category differs from the live model.",
+    ["version"]
+))
+SHADOW_PROBABILITY_DELTA = REGISTRY.register(Histogram(
+    "churn_shadow_probability_delta",
+    "Absolute churn probability difference between the shadow and live model.",
+    ["version"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+))
+SHADOW_DROPPED = REGISTRY.register(Counter(
+    "churn_shadow_dropped_total",
+    "Sampled shadow batches skipped because the shadow scorer was busy."
+))
+
+
+def count_predictions(risk_categories: Sequence[str]):
+    """Increment churn_predictions_total for a batch of risk categories."""
+    counts: Dict[str, int] = {}
+    for risk in risk_categories:
+        counts[risk] = counts.get(risk, 0) + 1
+    for risk, count in counts.items():
+        PREDICTIONS_TOTAL.inc(count, risk=risk)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording churn_http_request_duration_seconds.
+
+    Requests are labelled with their route path (unknown paths become
+    "other" so the label set stays bounded) and response status. The
+    duration runs until the last body chunk is sent, so streamed responses
+    are measured in full.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._paths = None
+
+    def _route_path(self, scope) -> str:
+        """Matched route path, or "other"."""
+        if self._paths is None and "app" in scope:
+            self._paths = {getattr(route, "path", None) for route in scope["app"].routes}
+        path = scope.get("path", "")
+        return path if self._paths and path in self._paths else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = ["500"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, path=self._route_path(scope), status=status[0]
+            )
@@ -0,0 +1,118 @@
+"""
+Dynamic micro-batching for single-customer prediction requests
+
+Concurrent single-customer requests are collected for up to a short wait
+window (or until a maximum batch size is reached) and scored together as
+one feature matrix. Each caller awaits its own result, so the API contract
+is unchanged while the per-call predict_proba overhead is shared. When a
+batch fails, its items are scored again one by one, so a malformed request
+only fails its own caller.
+
+Configuration (environment variables):
+- MICRO_BATCH_MAX_SIZE: max requests per batch (default: 32, 1 disables batching)
+- MICRO_BATCH_MAX_WAIT_MS: max time the first request waits for company (default: 5)
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent submit() calls into batched runner invocations.
+
+    The runner receives a list of items and must return a list of results
+    in the same order. If it raises for a batch of several items, each item
+    is retried in a batch of its own and gets its own result or error.
+    """
+
+    def __init__(self, runner: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.batches_run = 0
+        self.items_run = 0
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, runner: Callable[[List[Any]], Awaitable[List[Any]]]) -> "MicroBatcher":
+        """Create a batcher configured from MICRO_BATCH_* environment variables."""
+        return cls(
+            runner,
+            max_batch_size=int(os.environ.get("MICRO_BATCH_MAX_SIZE", "32")),
+            max_wait_ms=float(os.environ.get("MICRO_BATCH_MAX_WAIT_MS", "5"))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """False when batches are capped at a single item."""
+        return self.max_batch_size > 1
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item for the next batch and await its individual result."""
+        if not self.enabled:
+            return (await self.runner([item]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Hand the collected items to the runner as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Score one batch and resolve each caller's future."""
+        self.batches_run += 1
+        self.items_run += len(batch)
+        try:
+            results = await self.runner([item for item, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                _, future = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            # One bad item must not fail the callers it was batched with
+            logger.warning(f"Micro-batch of {len(batch)} failed ({e}); scoring its items one by one")
+            await asyncio.gather(*(self._run([entry]) for entry in batch))
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """Batching configuration and counters."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches_run": self.batches_run,
+            "items_run": self.items_run,
+            "pending": len(self._pending)
+        }
@@ -0,0 +1,414 @@
+"""
+Versioned model registry with zero-downtime hot-swap and shadow scoring
+
+A registry is a directory with one subdirectory per model version, each
+holding churn_model.npz (compiled artifact) or churn_model.joblib plus
+churn_model_scaler.joblib:
+
+    registry/
+        v2.0.0/churn_model.joblib
+        v2.0.0/churn_model_scaler.joblib
+        v2.1.0/churn_model.npz
+        CURRENT      <- optional, names the live version (default: highest version)
+        SHADOW       <- optional, {"version": "v2.1.0", "sample_pct": 10}
+
+A background watcher in every serving process polls the pointer files.
+When CURRENT changes it loads and warms the new version off the request
+path and then swaps the live predictor atomically (churn_predictor.set_model);
+in-flight requests finish on the version they started with. Loaded versions
+are kept (up to CHURN_REGISTRY_KEEP) so switching back is instant. A
+version whose files are replaced in place (the .npz, or the joblib model
+and scaler) is reloaded within CHURN_MODEL_RELOAD_SECS.
+
+With a SHADOW candidate, a random sample of the rows scored by the live
+model is re-scored by the candidate on a background thread and the
+differences are recorded as churn_shadow_* metrics; responses always come
+from the live model.
+
+Configuration (environment variables):
+- CHURN_MODEL_REGISTRY: registry directory (unset disables the registry)
+- CHURN_REGISTRY_POLL_SECS: how often pointer files are checked (default: 10)
+- CHURN_REGISTRY_KEEP: loaded versions kept in memory (default: 3)
+- CHURN_SHADOW_SAMPLE_PCT: default shadow sample percentage (default: 10)
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from churn_predictor import ChurnPredictor, set_model
+from metrics import SHADOW_ROWS, SHADOW_DISAGREEMENTS, SHADOW_PROBABILITY_DELTA, SHADOW_DROPPED
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CURRENT_POINTER = "CURRENT"
+SHADOW_POINTER = "SHADOW"
+MODEL_FILES = ("churn_model.npz", "churn_model.joblib")
+
+
+def version_key(version: str) -> tuple:
+    """Natural sort key, so v2.10.0 sorts after v2.9.0."""
+    return tuple(int(part) if part.isdigit() else part for part in re.split(r"(\d+)", version))
+
+
+class ShadowScorer:
+    """
+    Scores a sample of live traffic with a candidate model in the background.
+
+    At most one comparison runs at a time; sampled batches arriving while
+    it is busy are dropped rather than queued, so shadowing never adds
+    latency or unbounded memory to the live path.
+    """
+
+    def __init__(self, candidate: ChurnPredictor, version: str, sample_pct: float):
+        self.candidate = candidate
+        self.version = version
+        self.sample_pct = max(0.0, min(100.0, float(sample_pct)))
+        self.rows = 0
+        self.disagreements = 0
+        self.dropped = 0
+        self.abs_diff_sum = 0.0
+        self.max_abs_diff = 0.0
+        self._busy = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+
+    def submit(self, raw_matrix: np.ndarray, probabilities: np.ndarray, risk_categories: np.ndarray):
+        """Sample rows of a live batch and queue them for candidate scoring."""
+        sampled = np.random.random(raw_matrix.shape[0]) * 100 < self.sample_pct
+        if not sampled.any():
+            return
+        if not self._busy.acquire(blocking=False):
+            self.dropped += 1
+            SHADOW_DROPPED.inc()
+            return
+        try:
+            self._executor.submit(
+                self._compare, raw_matrix[sampled], probabilities[sampled], risk_categories[sampled]
+            )
+        except RuntimeError:
+            self._busy.release()
+
+    def _compare(self, raw_matrix: np.ndarray, probabilities: np.ndarray, risk_categories: np.ndarray):
+        """Score the sampled rows with the candidate and record the differences."""
+        try:
+            shadow_probs = self.candidate.predict_raw(raw_matrix)
+            shadow_categories = self.candidate._get_risk_categories(shadow_probs)
+            abs_diff = np.abs(shadow_probs - probabilities)
+            disagreements = int((shadow_categories != risk_categories).sum())
+
+            self.rows += len(abs_diff)
+            self.disagreements += disagreements
+            self.abs_diff_sum += float(abs_diff.sum())
+            self.max_abs_diff = max(self.max_abs_diff, float(abs_diff.max()))
+            SHADOW_ROWS.inc(len(abs_diff), version=self.version)
+            SHADOW_DISAGREEMENTS.inc(disagreements, version=self.version)
+            SHADOW_PROBABILITY_DELTA.observe_many(abs_diff, version=self.version)
+        except Exception as e:
+            logger.error(f"Shadow scoring with {self.version} failed: {e}")
+        finally:
+            self._busy.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Comparison totals since the candidate was attached."""
+        return {
+            "version": self.version,
+            "sample_pct": self.sample_pct,
+            "rows": self.rows,
+            "risk_disagreements": self.disagreements,
+            "risk_agreement_rate": round(1 - self.disagreements / self.rows, 4) if self.rows else None,
+            "mean_abs_probability_diff": round(self.abs_diff_sum / self.rows, 6) if self.rows else None,
+            "max_abs_probability_diff": round(self.max_abs_diff, 6),
+            "dropped_batches": self.dropped
+        }
+
+    def shutdown(self):
+        """Stop the background thread once pending work finishes."""
+        self._executor.shutdown(wait=False)
+
+
+class ModelRegistry:
+    """
+    Directory of versioned models plus the loaded predictors of this process.
+
+    Args:
+        root: Registry directory
+        keep: Max loaded versions kept in memory (the live and shadow
+            versions are never evicted)
+        poll_secs: Watcher poll interval
+        default_sample_pct: Shadow sample percentage when SHADOW omits it
+    """
+
+    def __init__(self, root: str, keep: int = 3, poll_secs: float = 10.0, default_sample_pct: float = 10.0):
+        self.root = root
+        self.keep = max(1, keep)
+        self.poll_secs = poll_secs
+        self.default_sample_pct = default_sample_pct
+        self.live_version: Optional[str] = None
+        self._live: Optional[ChurnPredictor] = None
+        self.shadow: Optional[ShadowScorer] = None
+        self._loaded: "OrderedDict[str, ChurnPredictor]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["ModelRegistry"]:
+        """Create a registry from CHURN_MODEL_REGISTRY, or None when it is not set."""
+        root = os.environ.get("CHURN_MODEL_REGISTRY")
+        if not root:
+            return None
+        return cls(
+            root,
+            keep=int(os.environ.get("CHURN_REGISTRY_KEEP", "3")),
+            poll_secs=float(os.environ.get("CHURN_REGISTRY_POLL_SECS", "10")),
+            default_sample_pct=float(os.environ.get("CHURN_SHADOW_SAMPLE_PCT", "10"))
+        )
+
+    def versions(self) -> List[str]:
+        """Available versions, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            (name for name in os.listdir(self.root) if self.model_path(name) is not None),
+            key=version_key
+        )
+
+    def model_path(self, version: str) -> Optional[str]:
+        """Model file of a version (compiled artifact preferred), or None if it has none."""
+        if not version or version.startswith(".") or os.path.basename(version) != version:
+            return None
+        directory = os.path.join(self.root, version)
+        if not os.path.isdir(directory):
+            return None
+        for name in MODEL_FILES:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def current_version(self) -> Optional[str]:
+        """Version named by CURRENT, else the highest available version."""
+        pointer = self._read_pointer(CURRENT_POINTER)
+        if pointer:
+            return pointer.strip()
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def shadow_config(self) -> Optional[Dict[str, Any]]:
+        """Parsed SHADOW pointer, or None when no candidate is configured."""
+        pointer = self._read_pointer(SHADOW_POINTER)
+        if not pointer:
+            return None
+        config = json.loads(pointer)
+        if not config.get("version"):
+            return None
+        config.setdefault("sample_pct", self.default_sample_pct)
+        return config
+
+    def _read_pointer(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, name)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_pointer(self, name: str, content: Optional[str]):
+        """Atomically replace (or with None, remove) a pointer file."""
+        path = os.path.join(self.root, name)
+        if content is None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def load(self, version: str) -> ChurnPredictor:
+        """
+        Return the warmed predictor of a version, loading it on first use
+        and again whenever its artifact has been replaced on disk.
+
+        Raises:
+            KeyError: If the version does not exist in the registry
+        """
+        with self._lock:
+            predictor = self._loaded.get(version)
+            if predictor is not None:
+                if not predictor.artifact_changed(force=True):
+                    self._loaded.move_to_end(version)
+                    return predictor
+                # The version's artifact was rewritten in place; load it again
+                del self._loaded[version]
+
+        path = self.model_path(version)
+        if path is None:
+            raise KeyError(f"Unknown model version: {version}")
+        predictor = ChurnPredictor(model_path=path)
+        predictor.load_model(fallback=False)
+        predictor.model_version = version
+        predictor.warm_up()
+        logger.info(f"Model version {version} loaded from {path}")
+
+        with self._lock:
+            loaded = self._loaded.get(version)
+            if loaded is None or loaded.artifact_changed(force=True):
+                self._loaded[version] = predictor
+            else:
+                predictor = loaded
+            self._evict()
+        return predictor
+
+    def _evict(self):
+        """Drop least recently used versions beyond keep, sparing live and shadow."""
+        pinned = {self.live_version, self.shadow.version if self.shadow else None}
+        for version in list(self._loaded):
+            if len(self._loaded) <= self.keep:
+                break
+            if version not in pinned:
+                del self._loaded[version]
+
+    def load_live(self) -> Optional[ChurnPredictor]:
+        """Load the current version as the live predictor (used at process start)."""
+        version = self.current_version()
+        if version is None:
+            logger.warning(f"Model registry {self.root} has no versions")
+            return None
+        predictor = self.load(version)
+        self.live_version = version
+        self._live = predictor
+        self._apply_shadow()
+        return predictor
+
+    def activate(self, version: str, publish: bool = True) -> ChurnPredictor:
+        """
+        Make a version live: load and warm it, then swap it in atomically.
+
+        Args:
+            version: Registry version to serve
+            publish: Also point CURRENT at it so other processes follow
+
+        Raises:
+            KeyError: If the version does not exist in the registry
+        """
+        with self._swap_lock:
+            predictor = self.load(version)
+            if publish:
+                self._write_pointer(CURRENT_POINTER, version + "\n")
+            previous = self.live_version
+            self.live_version = version
+            self._live = predictor
+            self._apply_shadow()
+            set_model(predictor)
+            if previous != version:
+                logger.info(f"Live model switched from {previous} to {version}")
+            return predictor
+
+    def set_shadow(self, version: Optional[str], sample_pct: Optional[float] = None, publish: bool = True):
+        """
+        Start shadow scoring a candidate version, or stop it with version=None.
+
+        Raises:
+            KeyError: If the version does not exist in the registry
+        """
+        with self._swap_lock:
+            if version is None:
+                config = None
+            else:
+                config = {
+                    "version": version,
+                    "sample_pct": self.default_sample_pct if sample_pct is None else float(sample_pct)
+                }
+                self.load(version)
+            if publish:
+                self._write_pointer(SHADOW_POINTER, json.dumps(config) if config else None)
+            self._configure_shadow(config)
+
+    def _configure_shadow(self, config: Optional[Dict[str, Any]]):
+        """Replace the shadow scorer to match a SHADOW config and attach it to the live model."""
+        current = (self.shadow.version, self.shadow.sample_pct) if self.shadow else None
+        wanted = (config["version"], float(config["sample_pct"])) if config else None
+        if current != wanted:
+            if self.shadow is not None:
+                self.shadow.shutdown()
+            self.shadow = None
+            if config:
+                self.shadow = ShadowScorer(self.load(config["version"]), config["version"], config["sample_pct"])
+                logger.info(f"Shadow scoring {config['version']} on {self.shadow.sample_pct}% of rows")
+        self._apply_shadow()
+
+    def _apply_shadow(self):
+        """Attach the shadow scorer to the live predictor only, never to itself."""
+        with self._lock:
+            predictors = list(self._loaded.values())
+        for predictor in predictors:
+            if predictor is not self._live:
+                predictor.shadow = None
+        if self._live is not None:
+            shadowed = self.shadow is not None and self.shadow.version != self.live_version
+            self._live.shadow = self.shadow if shadowed else None
+
+    def sync(self):
+        """Follow the CURRENT and SHADOW pointers; called periodically by the watcher."""
+        version = self.current_version()
+        if version is not None and version != self.live_version:
+            self.activate(version, publish=False)
+        with self._swap_lock:
+            self._configure_shadow(self.shadow_config())
+
+    def start_watcher(self):
+        """Start the background pointer watcher once per process."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+        self._watcher.start()
+        logger.info(f"Watching model registry {self.root} every {self.poll_secs}s")
+
+    def stop_watcher(self):
+        """Stop the background watcher."""
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_secs):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Model registry sync failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Registry contents and the state of this process."""
+        with self._lock:
+            loaded = list(self._loaded)
+        return {
+            "registry": self.root,
+            "live_version": self.live_version,
+            "available_versions": self.versions(),
+            "loaded_versions": loaded,
+            "shadow": self.shadow.stats() if self.shadow else None
+        }
+
+
+MODEL_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_model_registry() -> Optional[ModelRegistry]:
+    """Get or create the process-wide registry; None when CHURN_MODEL_REGISTRY is unset."""
+    global MODEL_REGISTRY
+    if MODEL_REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if MODEL_REGISTRY is None:
+                MODEL_REGISTRY = ModelRegistry.from_env()
+    return MODEL_REGISTRY
@@ -0,0 +1,160 @@
+"""
+Declarative churn explanation rules evaluated over whole batches
+
+Top churn factors, recommended retention actions and the days-until-churn
+estimate are driven by a JSON rule table (churn_rules.json by default, or
+the file named by CHURN_RULES_PATH) so thresholds, messages and promo codes
+can be changed without touching code.
+
+Every rule is a comparison of one raw input column against a constant.
+Rules are evaluated as boolean masks over the (n_customers, n_features)
+raw feature matrix; per-customer message lists are then built once per
+distinct mask pattern rather than once per customer.
+"""
+
+import os
+import json
+import logging
+import operator
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "churn_rules.json")
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne
+}
+
+
+class RuleSet:
+    """
+    Compiled rule table bound to the column order of a raw feature matrix.
+
+    Args:
+        config: Parsed rule table (see churn_rules.json)
+        field_names: Name of each raw feature matrix column
+    """
+
+    def __init__(self, config: Dict[str, Any], field_names: Sequence[str]):
+        self.config = config
+        self.field_index = {name: i for i, name in enumerate(field_names)}
+
+        factors = config["top_churn_factors"]
+        self.max_factors = int(factors.get("max_factors", 5))
+        self.factor_fallback = factors.get("fallback", "No significant risk factors identified")
+        self.factor_rules = [self._compile_condition(rule) for rule in factors["rules"]]
+        self.factor_messages = [rule["message"] for rule in factors["rules"]]
+
+        actions = config["recommended_actions"]
+        self.action_rules = [self._compile_condition(rule) for rule in actions]
+        self.action_risks = [rule.get("risk") for rule in actions]
+        self.action_messages = [rule["message"] for rule in actions]
+
+        days = config["days_until_churn"]
+        self.horizon_days = float(days.get("horizon_days", 180))
+        self.min_days = int(days.get("min_days", 7))
+        self.max_days = int(days.get("max_days", 365))
+        self.contract_rule = self._compile_condition(days["contract_ending"]) if "contract_ending" in days else None
+        self.sentiment_rule = (
+            self._compile_condition(days["sentiment_acceleration"]) if "sentiment_acceleration" in days else None
+        )
+
+    @classmethod
+    def load(cls, field_names: Sequence[str], path: Optional[str] = None) -> "RuleSet":
+        """Load a rule table from path, CHURN_RULES_PATH or the bundled default."""
+        path = path or os.environ.get("CHURN_RULES_PATH") or DEFAULT_RULES_PATH
+        with open(path) as f:
+            config = json.load(f)
+        logger.info(f"Churn rules loaded from {path}")
+        return cls(config, field_names)
+
+    def _compile_condition(self, rule: Dict[str, Any]) -> Optional[tuple]:
+        """Resolve a rule's field/op/value into (column index, comparison, value)."""
+        if "field" not in rule:
+            return None
+        if rule["field"] not in self.field_index:
+            raise ValueError(f"Unknown rule field: {rule['field']}")
+        if rule.get("op") not in OPERATORS:
+            raise ValueError(f"Unknown rule operator: {rule.get('op')}")
+        return (self.field_index[rule["field"]], OPERATORS[rule["op"]], float(rule["value"]))
+
+    @staticmethod
+    def _mask(raw: np.ndarray, condition: Optional[tuple]) -> np.ndarray:
+        """Boolean mask of the rows that satisfy a compiled condition."""
+        if condition is None:
+            return np.ones(raw.shape[0], dtype=bool)
+        column, compare, value = condition
+        return compare(raw[:, column], value)
+
+    def top_churn_factors(self, raw: np.ndarray) -> List[List[str]]:
+        """First max_factors matching factor messages for every row."""
+        masks = _stack_masks([self._mask(raw, rule) for rule in self.factor_rules], raw.shape[0])
+
+        def messages(pattern: np.ndarray) -> List[str]:
+            factors = [self.factor_messages[j] for j in np.flatnonzero(pattern)[:self.max_factors]]
+            return factors if factors else [self.factor_fallback]
+
+        return _messages_by_pattern(masks, messages)
+
+    def recommended_actions(self, raw: np.ndarray, risk_categories: np.ndarray) -> List[List[str]]:
+        """Matching action messages, in rule order, for every row."""
+        masks = _stack_masks([
+            self._mask(raw, rule) & (np.isin(risk_categories, risks) if risks else True)
+            for rule, risks in zip(self.action_rules, self.action_risks)
+        ], raw.shape[0])
+
+        def messages(pattern: np.ndarray) -> List[str]:
+            return [self.action_messages[j] for j in np.flatnonzero(pattern)]
+
+        return _messages_by_pattern(masks, messages)
+
+    def days_until_churn(self, raw: np.ndarray, probabilities: np.ndarray) -> np.ndarray:
+        """Estimated days until likely churn for every row."""
+        base_days = np.floor((1 - probabilities) * self.horizon_days)
+
+        if self.contract_rule is not None:
+            column = self.contract_rule[0]
+            days_per_month = self.config["days_until_churn"]["contract_ending"].get("days_per_month", 30)
+            base_days = np.where(
+                self._mask(raw, self.contract_rule),
+                np.minimum(base_days, raw[:, column] * days_per_month),
+                base_days
+            )
+
+        if self.sentiment_rule is not None:
+            factor = self.config["days_until_churn"]["sentiment_acceleration"].get("factor", 0.7)
+            base_days = np.where(self._mask(raw, self.sentiment_rule), np.trunc(base_days * factor), base_days)
+
+        return np.clip(base_days, self.min_days, self.max_days).astype(np.int64)
+
+
+def _stack_masks(masks: List[np.ndarray], n_rows: int) -> np.ndarray:
+    """Stack per-rule masks into an (n_rows, n_rules) matrix."""
+    if not masks:
+        return np.zeros((n_rows, 0), dtype=bool)
+    return np.column_stack(masks)
+
+
+def _messages_by_pattern(masks: np.ndarray, build) -> List[List[str]]:
+    """Build each distinct mask pattern's message list once and fan it out to its rows."""
+    if masks.shape[1] == 0:
+        empty = build(masks[:0].reshape(0))
+        return [list(empty) for _ in range(masks.shape[0])]
+    if masks.shape[1] <= 62:
+        # Encode each row's pattern as one integer; far cheaper than a row-wise unique
+        weights = np.left_shift(np.int64(1), np.arange(masks.shape[1], dtype=np.int64))
+        _, first, inverse = np.unique(masks @ weights, return_index=True, return_inverse=True)
+        patterns = masks[first]
+    else:
+        patterns, inverse = np.unique(masks, axis=0, return_inverse=True)
+    lists = [build(pattern) for pattern in patterns]
+    return [list(lists[k]) for k in inverse.ravel()]
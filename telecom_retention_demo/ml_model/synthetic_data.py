@@ -0,0 +1,44 @@
+"""
+Synthetic customers for the benchmarks and the start-up warm-up
+
+Customers follow the CustomerFeatures field ranges, so they exercise the
+same validation and scoring paths as real traffic. Kept separate from
+benchmark.py so the serving image does not need the benchmark script.
+"""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def generate_customers(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Synthetic customers within the CustomerFeatures field ranges.
+
+    Distributions are loosely modelled on the demo data: most customers are
+    healthy, with long-tailed counts of dropped calls, complaints and
+    payment issues. The same seed always yields the same customers.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {
+        "avg_data_usage_pct": np.round(np.clip(rng.normal(60, 30, n), 0, 200), 1),
+        "data_usage_trend": np.round(np.clip(rng.normal(0, 0.3, n), -1, 1), 2),
+        "avg_voice_usage_pct": np.round(np.clip(rng.normal(50, 25, n), 0, 200), 1),
+        "avg_days_inactive": rng.poisson(2, n),
+        "avg_signal_strength": np.clip(rng.normal(-80, 12, n), -120, -30).astype(int),
+        "total_dropped_calls": rng.poisson(1.5, n),
+        "coverage_issues_count": rng.poisson(0.3, n),
+        "complaint_count": rng.poisson(0.8, n),
+        "negative_sentiment_count": rng.poisson(0.6, n),
+        "avg_nps_score": np.round(np.clip(rng.normal(7, 2, n), 0, 10), 1),
+        "tenure_months": rng.exponential(24, n).astype(int),
+        "monthly_fee": np.round(np.clip(rng.normal(60, 20, n), 10, 200), 2),
+        "payment_issues_count": rng.poisson(0.2, n),
+        "customer_segment": rng.choice(["Premium", "Standard", "Budget"], n, p=[0.2, 0.55, 0.25]),
+        "contract_months_remaining": rng.integers(0, 25, n)
+    }
+    values = {name: column.tolist() for name, column in columns.items()}
+    return [
+        {"customer_id": f"BENCH-{i:07d}", **{name: column[i] for name, column in values.items()}}
+        for i in range(n)
+    ]
@@ -0,0 +1,6 @@
+"""Make the service modules importable from the tests, as they are inside the container (/app)."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
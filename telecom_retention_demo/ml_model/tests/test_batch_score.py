@@ -0,0 +1,138 @@
+"""Delta batch scoring with a fingerprint store: reuse, invalidation and CSV record alignment."""
+
+import csv
+import io
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+
+import batch_score
+import churn_predictor
+from churn_predictor import ChurnPredictor
+from fingerprint_store import FingerprintStore
+from synthetic_data import generate_customers
+
+
+def save_model(path: str, seed: int, version: str = "v1"):
+    """Train a small model on seeded random data and save it as joblib files at path."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(400, 15))
+    y = (X[:, 0] + X[:, seed % 15] + rng.normal(scale=0.5, size=400)) > 0
+    predictor = ChurnPredictor(model_path=path, engine="sklearn")
+    predictor.scaler = StandardScaler().fit(X)
+    predictor.model = GradientBoostingClassifier(n_estimators=20, max_depth=3, random_state=seed)
+    predictor.model.fit(predictor.scaler.transform(X), y)
+    predictor.model_version = version
+    predictor.save_model()
+
+
+def write_features(path: str, customers):
+    pq.write_table(pa.Table.from_pylist(customers), path)
+
+
+def read_rows(path: str):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+@pytest.fixture
+def model_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "model" / "churn_model.joblib")
+    save_model(path, seed=1)
+    monkeypatch.setenv("CHURN_MODEL_PATH", path)
+    monkeypatch.setenv("CHURN_INFERENCE_ENGINE", "sklearn")
+    monkeypatch.setenv("PREDICTION_CACHE_SIZE", "0")
+    monkeypatch.setattr(churn_predictor, "MODEL_INSTANCE", None)
+    monkeypatch.setattr(batch_score, "_WORKER_MODEL", None)
+    monkeypatch.setattr(batch_score, "_WORKER_STORE", None)
+    return path
+
+
+def score(paths, output, store_path=None):
+    return batch_score.score_files(paths, str(output), workers=1, chunk_rows=64, store_path=store_path)
+
+
+def test_unchanged_customers_are_reused(model_path, tmp_path):
+    features = str(tmp_path / "features.parquet")
+    write_features(features, generate_customers(200, seed=3))
+    store = str(tmp_path / "store")
+
+    first = score([features], tmp_path / "first.csv", store)
+    second = score([features], tmp_path / "second.csv", store)
+
+    assert first["rows_reused"] == 0
+    assert second["rows_reused"] == 200
+    assert (tmp_path / "second.csv").read_bytes() == (tmp_path / "first.csv").read_bytes()
+
+
+def test_retrained_model_under_same_version_reuses_nothing(model_path, tmp_path, monkeypatch):
+    features = str(tmp_path / "features.parquet")
+    write_features(features, generate_customers(200, seed=3))
+    store = str(tmp_path / "store")
+    score([features], tmp_path / "old.csv", store)
+
+    save_model(model_path, seed=2)
+    monkeypatch.setattr(churn_predictor, "MODEL_INSTANCE", None)
+    delta = score([features], tmp_path / "delta.csv", store)
+    full = score([features], tmp_path / "full.csv")
+
+    assert delta["model_version"] == "v1"
+    assert delta["rows_reused"] == 0
+    assert read_rows(tmp_path / "delta.csv") == read_rows(tmp_path / "full.csv")
+    assert read_rows(tmp_path / "delta.csv") != read_rows(tmp_path / "old.csv")
+
+
+def test_worker_with_a_different_model_ignores_the_store(model_path, tmp_path, monkeypatch):
+    customers = generate_customers(50, seed=3)
+    store_path = str(tmp_path / "store")
+    features = str(tmp_path / "features.parquet")
+    write_features(features, customers)
+    score([features], tmp_path / "first.csv", store_path)
+
+    # The store still carries the first model's signature; this worker holds a swapped model
+    swapped_path = str(tmp_path / "swapped" / "churn_model.joblib")
+    save_model(swapped_path, seed=2)
+    swapped = ChurnPredictor(model_path=swapped_path, engine="sklearn")
+    swapped.load_model(fallback=False)
+    assert swapped.model_version == FingerprintStore(store_path).signature["model_version"]
+    monkeypatch.setattr(batch_score, "_WORKER_MODEL", swapped)
+
+    batch = pa.Table.from_pylist(customers).to_batches()[0]
+    data, n_rows, _, update, n_reused = batch_score.score_chunk(batch, store_path=store_path)
+
+    assert n_rows == 50
+    assert n_reused == 0
+    assert update is None
+
+
+def test_customer_ids_with_newlines_keep_rows_aligned(model_path, tmp_path):
+    customers = generate_customers(100, seed=4)
+    customers[5]["customer_id"] = "multi\nline"
+    customers[17]["customer_id"] = 'quoted "id"\nwith break'
+    customers[60]["customer_id"] = "trailing\n"
+    features = str(tmp_path / "features.parquet")
+    write_features(features, customers)
+    store = str(tmp_path / "store")
+
+    score([features], tmp_path / "full.csv")
+    first = score([features], tmp_path / "first.csv", store)
+    second = score([features], tmp_path / "second.csv", store)
+
+    expected = read_rows(tmp_path / "full.csv")
+    assert [row[0] for row in expected[1:]] == [customer["customer_id"] for customer in customers]
+    assert read_rows(tmp_path / "first.csv") == expected
+    assert second["rows_reused"] == first["rows"]
+    assert read_rows(tmp_path / "second.csv") == expected
+
+
+def test_csv_records_split_only_outside_quotes():
+    data = b'"a",1\n"b\nc",2\n"d ""x""\ne",3\n'
+    records = batch_score._csv_records(data)
+    assert records == [b'"a",1', b'"b\nc",2', b'"d ""x""\ne",3']
+    assert list(csv.reader(io.StringIO(data.decode()))) == [
+        next(csv.reader(io.StringIO(record.decode()))) for record in records
+    ]
@@ -0,0 +1,41 @@
+"""export_model only publishes artifacts of the requested model that pass verification."""
+
+import os
+
+import export_model
+from churn_predictor import ChurnPredictor
+
+
+def save_default_model(path: str):
+    predictor = ChurnPredictor(model_path=path, engine="sklearn")
+    predictor._initialize_default_model()
+    predictor.save_model()
+
+
+def test_exports_a_verified_artifact(tmp_path):
+    model = str(tmp_path / "churn_model.joblib")
+    save_default_model(model)
+
+    assert export_model.main(["--model", model]) == 0
+    assert (tmp_path / "churn_model.npz").exists()
+    assert not [name for name in os.listdir(tmp_path) if ".unverified-" in name]
+
+
+def test_corrupt_model_is_not_replaced_by_the_demo_model(tmp_path):
+    model = tmp_path / "churn_model.joblib"
+    save_default_model(str(model))
+    model.write_bytes(b"not a pickle")
+
+    assert export_model.main(["--model", str(model)]) == 1
+    assert not (tmp_path / "churn_model.npz").exists()
+
+
+def test_failed_verification_keeps_the_published_artifact(tmp_path):
+    model = str(tmp_path / "churn_model.joblib")
+    output = tmp_path / "churn_model.npz"
+    save_default_model(model)
+    output.write_bytes(b"previous artifact")
+
+    assert export_model.main(["--model", model, "--tolerance", "-1"]) == 1
+    assert output.read_bytes() == b"previous artifact"
+    assert not [name for name in os.listdir(tmp_path) if ".unverified-" in name]
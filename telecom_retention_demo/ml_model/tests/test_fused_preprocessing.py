@@ -0,0 +1,157 @@
+"""Fused preprocessing must reach the same leaves, and so the same probabilities, as the unfused path."""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+
+from churn_predictor import ChurnPredictor
+from tree_engine import CompiledTreeEnsemble
+
+N_FEATURES = 15
+# customer_segment: one value in training, so the scaler sees zero variance
+CONSTANT = 13
+# avg_signal_strength: spread of 1e-5 dBm around -70, scaled up by a tiny scale_
+NEAR_CONSTANT = 4
+# monthly_fee: magnitudes up to ~1e15 of both signs
+EXTREME = 11
+# Largest magnitude fed to the trees; sklearn's float32 GBC input rejects more
+EXTREME_INPUT = 1e30
+
+
+def raw_training_data(n_rows: int = 600, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, N_FEATURES)) * 10 + 20
+    X[:, CONSTANT] = 1.0
+    X[:, NEAR_CONSTANT] = -70 + rng.normal(size=n_rows) * 1e-5
+    X[:, EXTREME] = rng.lognormal(mean=25, sigma=4, size=n_rows) * rng.choice([-1.0, 1.0], size=n_rows)
+    y = ((X[:, 0] > 20) ^ (X[:, EXTREME] > 0)) | (X[:, NEAR_CONSTANT] > -70 + 5e-6) | (X[:, 7] > 35)
+    return X, y.astype(int)
+
+
+def make_estimator(kind: str):
+    if kind == "gbc":
+        return GradientBoostingClassifier(n_estimators=40, max_depth=4, random_state=0)
+    return HistGradientBoostingClassifier(max_iter=40, max_depth=4, random_state=0)
+
+
+@pytest.fixture(params=["gbc", "hgb"])
+def predictor(request, tmp_path):
+    """A compiled predictor with the trained model and its fused copy."""
+    X, y = raw_training_data()
+    predictor = ChurnPredictor(model_path=str(tmp_path / "churn_model.joblib"), engine="compiled")
+    normalized = predictor._normalize(X)
+    predictor.scaler = StandardScaler().fit(normalized)
+    predictor.model = make_estimator(request.param).fit(predictor.scaler.transform(normalized), y)
+    predictor.compiled_model = CompiledTreeEnsemble.from_sklearn(predictor.model)
+    predictor._fused_model = predictor._fuse_preprocessing()
+    return predictor
+
+
+def boundary_rows(fused: CompiledTreeEnsemble, seed: int = 1) -> np.ndarray:
+    """Rows exactly on, one ulp below and one ulp above every finite fused threshold."""
+    X, _ = raw_training_data(seed=seed)
+    internal = np.isfinite(fused.threshold)
+    boundaries = np.unique(np.column_stack([fused.feature[internal], fused.threshold[internal]]), axis=0)
+    features = boundaries[:, 0].astype(np.int64)
+    thresholds = boundaries[:, 1]
+    values = np.concatenate([
+        thresholds,
+        np.nextafter(thresholds, -np.inf),
+        np.nextafter(thresholds, np.inf)
+    ])
+    columns = np.tile(features, 3)
+    rows = X[np.arange(len(values)) % len(X)].copy()
+    rows[np.arange(len(values)), columns] = values
+    return rows
+
+
+def extreme_rows(seed: int = 2) -> np.ndarray:
+    """Training-like rows with one column at a time pushed to +/-EXTREME_INPUT or zero."""
+    X, _ = raw_training_data(n_rows=N_FEATURES * 3, seed=seed)
+    for feature in range(N_FEATURES):
+        for k, value in enumerate((-EXTREME_INPUT, 0.0, EXTREME_INPUT)):
+            X[3 * feature + k, feature] = value
+    return X
+
+
+def unfused_input(predictor: ChurnPredictor, rows: np.ndarray) -> np.ndarray:
+    return predictor.scaler.transform(predictor._normalize(rows))
+
+
+def assert_same_paths(predictor: ChurnPredictor, rows: np.ndarray):
+    ensemble = predictor.compiled_model
+    fused = predictor._fused_model
+    expected = unfused_input(predictor, rows)
+    np.testing.assert_array_equal(fused.leaf_indices(rows), ensemble.leaf_indices(expected))
+    np.testing.assert_array_equal(fused.predict_proba(rows), ensemble.predict_proba(expected))
+
+
+def test_training_data_exercises_the_edge_columns(predictor):
+    split_features = set(predictor.compiled_model.feature[np.isfinite(predictor.compiled_model.threshold)].tolist())
+    assert predictor.scaler.scale_[CONSTANT] == 1.0
+    assert predictor.scaler.scale_[NEAR_CONSTANT] < 1e-6
+    assert {NEAR_CONSTANT, EXTREME} <= split_features
+    assert CONSTANT not in split_features
+
+
+def test_boundary_rows_take_the_unfused_paths(predictor):
+    rows = boundary_rows(predictor._fused_model)
+    assert len(rows) >= 3 * 20
+    assert_same_paths(predictor, rows)
+
+
+def test_fused_thresholds_are_tight(predictor):
+    """At every node the fused threshold goes left and the next float64 up goes right."""
+    ensemble = predictor.compiled_model
+    fused = predictor._fused_model
+    internal = np.isfinite(fused.threshold)
+    features = fused.feature[internal]
+    original = ensemble.threshold[internal]
+    nodes = np.arange(len(features))
+    rows = np.zeros((len(features), N_FEATURES))
+
+    def compared(values: np.ndarray) -> np.ndarray:
+        rows[nodes, features] = values
+        transformed = unfused_input(predictor, rows)[nodes, features]
+        return transformed.astype(ensemble.input_dtype).astype(np.float64)
+
+    assert (compared(fused.threshold[internal]) <= original).all()
+    assert (compared(np.nextafter(fused.threshold[internal], np.inf)) > original).all()
+
+
+def test_zero_variance_and_extreme_columns(predictor):
+    assert_same_paths(predictor, extreme_rows())
+
+
+def test_random_rows(predictor):
+    X, _ = raw_training_data(n_rows=2000, seed=3)
+    assert_same_paths(predictor, X)
+
+
+@pytest.mark.parametrize("kind", ["gbc", "hgb"])
+@pytest.mark.parametrize("engine", ["sklearn", "compiled"])
+def test_predictor_scores_match_with_and_without_fusion(kind, engine, tmp_path, monkeypatch):
+    X, y = raw_training_data()
+    path = str(tmp_path / "churn_model.joblib")
+    trainer = ChurnPredictor(model_path=path, engine="sklearn")
+    normalized = trainer._normalize(X)
+    trainer.scaler = StandardScaler().fit(normalized)
+    trainer.model = make_estimator(kind).fit(trainer.scaler.transform(normalized), y)
+    trainer.save_model()
+
+    predictors = {}
+    for fused in ("0", "1"):
+        monkeypatch.setenv("CHURN_FUSED_PREPROCESSING", fused)
+        predictors[fused] = ChurnPredictor(model_path=path, engine=engine)
+        predictors[fused].load_model(fallback=False)
+    assert predictors["0"]._fused_model is None
+    assert predictors["1"]._fused_model is not None
+
+    rows = np.vstack([boundary_rows(predictors["1"]._fused_model), extreme_rows()])
+    unfused, fused = (predictor._predict_proba(predictor._model_input(rows)) for predictor in predictors.values())
+    if engine == "compiled":
+        np.testing.assert_array_equal(fused, unfused)
+    else:
+        # sklearn sums the tree values in its own order; the leaves are still the same
+        np.testing.assert_allclose(fused, unfused, rtol=0, atol=1e-12)
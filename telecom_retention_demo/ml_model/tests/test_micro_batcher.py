@@ -0,0 +1,68 @@
+"""Micro-batching: coalescing, per-caller results and isolation of failing items."""
+
+import asyncio
+
+import httpx
+
+import app
+from micro_batcher import MicroBatcher
+
+
+def run_batched(items, runner, max_wait_ms=50.0):
+    """Submit items concurrently to one batcher; returns each result or exception and the batcher."""
+    batcher = MicroBatcher(runner, max_batch_size=32, max_wait_ms=max_wait_ms)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(item) for item in items), return_exceptions=True)
+
+    return asyncio.run(main()), batcher
+
+
+def test_concurrent_items_share_one_batch():
+    calls = []
+
+    async def runner(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    results, batcher = run_batched([1, 2, 3], runner)
+    assert results == [2, 4, 6]
+    assert calls == [[1, 2, 3]]
+    assert batcher.stats()["batches_run"] == 1
+
+
+def test_poisoned_item_only_fails_its_own_caller():
+    async def runner(items):
+        if "bad" in items:
+            raise ValueError("could not convert 'bad'")
+        return [item.upper() for item in items]
+
+    results, _ = run_batched(["a", "bad", "b", "c"], runner)
+    assert results[0] == "A"
+    assert isinstance(results[1], ValueError)
+    assert results[2:] == ["B", "C"]
+
+
+def test_failing_single_item_batch_raises_to_its_caller():
+    async def runner(items):
+        raise RuntimeError("model unavailable")
+
+    results, _ = run_batched(["a"], runner)
+    assert isinstance(results[0], RuntimeError)
+
+
+def test_malformed_snowflake_row_does_not_fail_batched_requests(monkeypatch):
+    monkeypatch.setattr(app.micro_batcher, "max_wait_ms", 50.0)
+    if app.get_model().cache is not None:
+        monkeypatch.setattr(app.get_model(), "cache", None)
+
+    async def main():
+        transport = httpx.ASGITransport(app=app.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            valid = [client.post("/predict", json={"customer_id": f"C{i}", "complaint_count": i}) for i in range(3)]
+            bad = client.post("/predict", json={"data": [[0, "bad", "abc"]]})
+            return await asyncio.gather(*valid, bad)
+
+    responses = asyncio.run(main())
+    assert [response.status_code for response in responses] == [200, 200, 200, 500]
+    assert [response.json()["customer_id"] for response in responses[:3]] == ["C0", "C1", "C2"]
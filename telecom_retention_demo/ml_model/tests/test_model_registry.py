@@ -0,0 +1,85 @@
+"""Registry versions whose files are rewritten in place are reloaded, for joblib and .npz alike."""
+
+import shutil
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+
+import churn_predictor
+import model_registry
+from churn_predictor import ChurnPredictor
+
+MODEL_FILES = ("churn_model.joblib", "churn_model_scaler.joblib", "churn_model_metadata.json")
+
+
+def train(directory, seed: int) -> ChurnPredictor:
+    """Train a small model on seeded random data and save its joblib files in directory."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(300, 15))
+    y = (X[:, 0] + X[:, seed % 15] > 0).astype(int)
+    predictor = ChurnPredictor(model_path=str(directory / "churn_model.joblib"), engine="sklearn")
+    predictor.scaler = StandardScaler().fit(X)
+    predictor.model = GradientBoostingClassifier(n_estimators=10, max_depth=3, random_state=seed)
+    predictor.model.fit(predictor.scaler.transform(X), y)
+    predictor.save_model()
+    return predictor
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHURN_MODEL_REGISTRY", str(tmp_path / "registry"))
+    monkeypatch.setenv("CHURN_MODEL_RELOAD_SECS", "0")
+    monkeypatch.setenv("CHURN_INFERENCE_ENGINE", "sklearn")
+    monkeypatch.setattr(model_registry, "MODEL_REGISTRY", None)
+    monkeypatch.setattr(churn_predictor, "MODEL_INSTANCE", None)
+    return tmp_path / "registry"
+
+
+def overwrite_in_place(source, target, names):
+    """Copy files over existing ones, keeping their inodes (like cp onto a mounted volume)."""
+    for name in names:
+        shutil.copyfile(source / name, target / name)
+
+
+def test_joblib_version_rewritten_in_place_is_reloaded(registry, tmp_path):
+    version = registry / "v1"
+    version.mkdir(parents=True)
+    train(version, seed=1)
+    retrained = tmp_path / "retrained"
+    retrained.mkdir()
+    train(retrained, seed=2)
+
+    first = churn_predictor.get_model()
+    assert first.model_version == "v1"
+    overwrite_in_place(retrained, version, MODEL_FILES)
+    second = churn_predictor.get_model()
+
+    assert second is not first
+    assert second.model_digest() != first.model_digest()
+    assert churn_predictor.get_model() is second
+
+
+def test_npz_version_replaced_is_reloaded(registry, tmp_path):
+    version = registry / "v1"
+    version.mkdir(parents=True)
+    train(tmp_path, seed=1).export_artifact(str(version / "churn_model.npz"))
+
+    first = churn_predictor.get_model()
+    train(tmp_path, seed=2).export_artifact(str(version / "churn_model.npz"))
+    second = churn_predictor.get_model()
+
+    assert second is not first
+    assert second.model_digest() != first.model_digest()
+    assert churn_predictor.get_model() is second
+
+
+def test_unchanged_version_is_served_from_the_registry_cache(registry):
+    version = registry / "v1"
+    version.mkdir(parents=True)
+    train(version, seed=1)
+
+    first = churn_predictor.get_model()
+    assert churn_predictor.get_model() is first
+    assert model_registry.get_model_registry().load("v1") is first
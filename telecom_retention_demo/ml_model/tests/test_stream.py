@@ -0,0 +1,57 @@
+"""The streaming endpoint releases its spooled upload whether scoring succeeds or fails."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import app
+
+
+@pytest.fixture
+def spooled(monkeypatch):
+    """Spooled upload bodies of the requests made during the test."""
+    bodies = []
+    spool_body = app.spool_body
+
+    async def capture(request):
+        body = await spool_body(request)
+        bodies.append(body)
+        return body
+
+    monkeypatch.setattr(app, "spool_body", capture)
+    return bodies
+
+
+def post_stream(content: bytes) -> str:
+    """POST an NDJSON upload to /predict/stream and return the streamed text read so far."""
+    async def main():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/predict/stream", content=content,
+                                         headers={"content-type": "application/x-ndjson"})
+            return response.text
+
+    return asyncio.run(main())
+
+
+def ndjson(n_rows: int) -> bytes:
+    return b"".join(json.dumps({"customer_id": f"C{i}"}).encode("utf-8") + b"\n" for i in range(n_rows))
+
+
+def test_upload_is_closed_after_a_complete_stream(spooled):
+    text = post_stream(ndjson(3))
+
+    assert json.loads(text.splitlines()[-1])["summary"]["total_processed"] == 3
+    assert spooled[0].closed
+
+
+def test_upload_is_closed_when_scoring_fails(spooled, monkeypatch):
+    async def failing_score_chunk(customers):
+        raise RuntimeError("scoring failed")
+
+    monkeypatch.setattr(app, "score_chunk", failing_score_chunk)
+    with pytest.raises(RuntimeError, match="scoring failed"):
+        post_stream(ndjson(3))
+    assert spooled[0].closed
@@ -0,0 +1,237 @@
+"""
+Streaming training pipeline for the churn model
+
+Trains a churn model on feature exports that do not fit in memory. Parquet
+or CSV files (e.g. a COPY INTO export of the per-customer features built
+from the tables in 02_generate_synthetic_data.sql, plus a churn label) are
+read in record-batch chunks and go through the same normalisation as
+ChurnPredictor._extract_features (missing values take their defaults,
+customer_segment becomes is_premium_segment).
+
+Two passes over the files keep memory bounded:
+1. Fit the StandardScaler incrementally (partial_fit per chunk) and count rows.
+2. Draw a uniform sample of at most --max-rows rows, scale it and train a
+   HistGradientBoostingClassifier on it, using all cores by default
+   (OpenMP threads; limit with --threads).
+
+Peak memory is roughly one chunk plus the --max-rows training sample. The
+model and scaler are written as churn_model.joblib / churn_model_scaler.joblib
+(with the --model-version in churn_model_metadata.json) via
+ChurnPredictor.save_model, and with --export-artifact also as the
+compiled .npz artifact. Trees are depth-limited (--max-depth) so the
+model can be compiled for the "compiled" inference engine.
+
+Input columns are matched case-insensitively: the SNOWFLAKE_FIELD_ORDER
+feature names and a label column (--label, default churned) holding 0/1,
+booleans or probabilities (>= --label-threshold counts as churned). Rows
+with a null label are skipped.
+
+Usage:
+    python train_model.py --input exports/features_*.parquet --output /app/model/churn_model.joblib
+    python train_model.py --input features.csv --label churned --max-rows 2000000 --export-artifact
+"""
+
+import argparse
+import logging
+import sys
+import time
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from churn_predictor import ChurnPredictor
+from arrow_io import find_input_files, iter_record_batches, table_to_columns
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def iter_chunks(paths: List[str], predictor: ChurnPredictor, label_column: str = "churned",
+                label_threshold: float = 0.5, chunk_rows: int = 100000) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yield (normalised feature matrix, 0/1 labels) chunks from the input files.
+
+    Args:
+        paths: Parquet/CSV files, read in order
+        predictor: Supplies the feature extraction and normalisation
+        label_column: Label column name (case-insensitive)
+        label_threshold: Label values >= this count as churned
+        chunk_rows: Rows per chunk
+
+    Returns:
+        Iterator of (n_rows, n_features) float64 features and int8 labels
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for path in paths:
+        for batch in iter_record_batches(path, chunk_rows):
+            table = pa.Table.from_batches([batch])
+            by_name = {name.lower(): name for name in table.column_names}
+            if label_column.lower() not in by_name:
+                raise ValueError(f"{path} has no '{label_column}' label column")
+            labels = pc.cast(table.column(by_name[label_column.lower()]), pa.float64())
+            labels = labels.to_numpy(zero_copy_only=False)
+            labeled = ~np.isnan(labels)
+
+            raw = predictor._extract_raw_columns(table_to_columns(table), table.num_rows)
+            yield predictor._normalize(raw[labeled]), (labels[labeled] >= label_threshold).astype(np.int8)
+
+
+def fit_scaler(chunks: Iterator[Tuple[np.ndarray, np.ndarray]]) -> Tuple[object, int, int]:
+    """
+    First pass: fit a StandardScaler chunk by chunk.
+
+    Returns:
+        (scaler, number of rows, number of churned rows)
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    n_rows = 0
+    n_positive = 0
+    for X, y in chunks:
+        if len(y) == 0:
+            continue
+        scaler.partial_fit(X)
+        n_rows += len(y)
+        n_positive += int(y.sum())
+    return scaler, n_rows, n_positive
+
+
+def sample_training_rows(chunks: Iterator[Tuple[np.ndarray, np.ndarray]], scaler: object,
+                         n_rows: int, max_rows: int, seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Second pass: collect a uniform sample of at most max_rows scaled rows.
+
+    The sampled row numbers are drawn up front, so every row has the same
+    chance of being picked and the sample is exactly min(n_rows, max_rows).
+    The chunks must come in the same order as in the first pass.
+    """
+    n_sample = min(n_rows, max_rows)
+    selected = None
+    if n_sample < n_rows:
+        selected = np.sort(np.random.default_rng(seed).choice(n_rows, n_sample, replace=False))
+
+    X_sample = np.empty((n_sample, scaler.n_features_in_), dtype=np.float64)
+    y_sample = np.empty(n_sample, dtype=np.int8)
+    offset = 0
+    filled = 0
+    for X, y in chunks:
+        if selected is None:
+            rows = np.arange(len(y))
+        else:
+            start, stop = np.searchsorted(selected, [offset, offset + len(y)])
+            rows = selected[start:stop] - offset
+        X_sample[filled:filled + len(rows)] = scaler.transform(X[rows])
+        y_sample[filled:filled + len(rows)] = y[rows]
+        filled += len(rows)
+        offset += len(y)
+    if filled != n_sample:
+        raise ValueError(f"Input changed between passes: expected {n_sample} sampled rows, read {filled}")
+    return X_sample, y_sample
+
+
+def train_model(X: np.ndarray, y: np.ndarray, max_iter: int = 300, learning_rate: float = 0.1,
+                max_depth: int = 6, max_leaf_nodes: int = 31, seed: int = 42) -> object:
+    """
+    Fit a HistGradientBoostingClassifier with early stopping on a 10% validation split.
+
+    Args:
+        X: Scaled training features
+        y: 0/1 labels
+        max_iter: Max boosting iterations (trees)
+        learning_rate: Shrinkage per tree
+        max_depth: Max tree depth; keeps the model compilable
+        max_leaf_nodes: Max leaves per tree
+        seed: Random seed for the validation split
+
+    Returns:
+        Fitted classifier
+    """
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    model = HistGradientBoostingClassifier(
+        max_iter=max_iter,
+        learning_rate=learning_rate,
+        max_depth=max_depth,
+        max_leaf_nodes=max_leaf_nodes,
+        early_stopping=True,
+        validation_fraction=0.1,
+        n_iter_no_change=10,
+        random_state=seed
+    )
+    model.fit(X, y)
+    return model
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train the churn model from Parquet/CSV feature exports")
+    parser.add_argument("--input", nargs="+", required=True,
+                        help="Parquet/CSV files, glob patterns or directories")
+    parser.add_argument("--output", default="/app/model/churn_model.joblib",
+                        help="Model path; the scaler is written next to it")
+    parser.add_argument("--label", default="churned", help="Label column (0/1, boolean or probability)")
+    parser.add_argument("--label-threshold", type=float, default=0.5,
+                        help="Label values >= this count as churned")
+    parser.add_argument("--chunk-rows", type=int, default=100000, help="Rows read per chunk")
+    parser.add_argument("--max-rows", type=int, default=2000000,
+                        help="Max rows in the in-memory training sample")
+    parser.add_argument("--max-iter", type=int, default=300, help="Max boosting iterations")
+    parser.add_argument("--learning-rate", type=float, default=0.1, help="Boosting learning rate")
+    parser.add_argument("--max-depth", type=int, default=6, help="Max tree depth")
+    parser.add_argument("--max-leaf-nodes", type=int, default=31, help="Max leaves per tree")
+    parser.add_argument("--threads", type=int, default=None, help="Training threads (default: all cores)")
+    parser.add_argument("--seed", type=int, default=42, help="Sampling and validation split seed")
+    parser.add_argument("--model-version", default=None, help="Version saved with the model and in the compiled artifact")
+    parser.add_argument("--export-artifact", action="store_true",
+                        help="Also write the compiled .npz artifact")
+    args = parser.parse_args(argv)
+
+    paths = find_input_files(args.input)
+    if not paths:
+        logger.error(f"No Parquet/CSV input files found in {args.input}")
+        return 1
+    logger.info(f"Training from {len(paths)} file(s)")
+
+    predictor = ChurnPredictor(model_path=args.output, engine="sklearn")
+    if args.model_version:
+        predictor.model_version = args.model_version
+
+    def chunks() -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        return iter_chunks(paths, predictor, args.label, args.label_threshold, args.chunk_rows)
+
+    start = time.perf_counter()
+    scaler, n_rows, n_positive = fit_scaler(chunks())
+    if n_rows == 0:
+        logger.error("Input files contain no labelled rows")
+        return 1
+    if n_positive in (0, n_rows):
+        logger.error("Labels contain a single class; cannot train a classifier")
+        return 1
+    logger.info(f"Pass 1: {n_rows} rows, churn rate {n_positive / n_rows:.2%} ({time.perf_counter() - start:.1f}s)")
+
+    start = time.perf_counter()
+    X, y = sample_training_rows(chunks(), scaler, n_rows, args.max_rows, args.seed)
+    logger.info(f"Pass 2: sampled {len(y)} of {n_rows} rows ({time.perf_counter() - start:.1f}s)")
+
+    start = time.perf_counter()
+    from threadpoolctl import threadpool_limits
+    with threadpool_limits(limits=args.threads):
+        model = train_model(X, y, args.max_iter, args.learning_rate, args.max_depth,
+                            args.max_leaf_nodes, args.seed)
+    logger.info(
+        f"Trained {model.n_iter_} trees in {time.perf_counter() - start:.1f}s, "
+        f"validation log-loss {-model.validation_score_[-1]:.4f}"
+    )
+
+    predictor.model = model
+    predictor.scaler = scaler
+    predictor.save_model()
+    if args.export_artifact:
+        predictor.export_artifact()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
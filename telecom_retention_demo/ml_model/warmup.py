@@ -0,0 +1,179 @@
+"""
+Start-up warm-up and readiness for the Churn Prediction API
+
+Right after start-up the first requests pay for lazy imports, first-call
+allocations, thread/process pool start-up and cold CPU caches. The warm-up
+runs synthetic customers through every scoring path at several batch sizes,
+in rounds, and measures each (path, batch size) case's p99 latency per
+round. The service reports ready once every case's p99 has settled, i.e.
+stayed within a tolerance of the previous round for a number of
+consecutive rounds, or once the round or time limit is reached.
+
+Liveness (/health) is unaffected; readiness (/ready) follows this state,
+so SPCS only routes traffic to a replica after its latency has settled.
+
+Configuration (environment variables):
+- WARMUP_MAX_ROUNDS: max warm-up rounds (default: 10, 0 disables warm-up)
+- WARMUP_BATCH_SIZES: comma-separated batch sizes (default: 1,32,500)
+- WARMUP_CALLS_PER_ROUND: timed calls per case and round (default: 20)
+- WARMUP_STABLE_ROUNDS: consecutive settled rounds required (default: 2)
+- WARMUP_P99_TOLERANCE: max relative p99 change between rounds (default: 0.25)
+- WARMUP_TIMEOUT_SECS: report ready regardless after this long (default: 120)
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from synthetic_data import generate_customers
+from inference_pool import PoolSaturatedError
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# p99 changes smaller than this are timer noise and never block settling
+P99_NOISE_FLOOR_MS = 1.0
+
+# A warm-up path scores a list of customer dicts; max_size caps the batch sizes it runs
+WarmupPath = Tuple[Callable[[List[Dict[str, Any]]], Awaitable[Any]], Optional[int]]
+
+
+class Warmup:
+    """
+    Runs the warm-up rounds and holds the readiness state.
+
+    States: "pending" (not started), "warming", "ready" and "failed".
+    """
+
+    def __init__(self, max_rounds: int = 10, batch_sizes: Sequence[int] = (1, 32, 500),
+                 calls_per_round: int = 20, stable_rounds: int = 2,
+                 p99_tolerance: float = 0.25, timeout_secs: float = 120.0):
+        self.max_rounds = max(0, max_rounds)
+        self.batch_sizes = sorted(set(batch_sizes))
+        self.calls_per_round = max(1, calls_per_round)
+        self.stable_rounds = max(1, stable_rounds)
+        self.p99_tolerance = p99_tolerance
+        self.timeout_secs = timeout_secs
+        self.state = "pending"
+        self.rounds = 0
+        self.settled = False
+        self.p99_ms: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.elapsed_secs = 0.0
+        self._seed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "Warmup":
+        """Create a warm-up configured from WARMUP_* environment variables."""
+        return cls(
+            max_rounds=int(os.environ.get("WARMUP_MAX_ROUNDS", "10")),
+            batch_sizes=[int(size) for size in os.environ.get("WARMUP_BATCH_SIZES", "1,32,500").split(",")],
+            calls_per_round=int(os.environ.get("WARMUP_CALLS_PER_ROUND", "20")),
+            stable_rounds=int(os.environ.get("WARMUP_STABLE_ROUNDS", "2")),
+            p99_tolerance=float(os.environ.get("WARMUP_P99_TOLERANCE", "0.25")),
+            timeout_secs=float(os.environ.get("WARMUP_TIMEOUT_SECS", "120"))
+        )
+
+    @property
+    def ready(self) -> bool:
+        """True once the service should receive traffic."""
+        return self.state == "ready"
+
+    def start(self, paths: Dict[str, WarmupPath], on_ready: Optional[Callable[[], None]] = None):
+        """Run the warm-up in the background on the current event loop."""
+        if self.max_rounds == 0:
+            self.state = "ready"
+            logger.info("Warm-up disabled, ready immediately")
+            return
+        self._task = asyncio.ensure_future(self.run(paths, on_ready))
+
+    async def run(self, paths: Dict[str, WarmupPath], on_ready: Optional[Callable[[], None]] = None):
+        """
+        Run rounds until every case's p99 has settled, then mark the service ready.
+
+        on_ready is called just before the state turns "ready", e.g. to drop
+        warm-up entries from the prediction cache.
+        """
+        self.state = "warming"
+        started = time.monotonic()
+        stable = 0
+        try:
+            while self.rounds < self.max_rounds:
+                p99_ms = await self._run_round(paths)
+                self.rounds += 1
+                if self.p99_ms and self._within_tolerance(self.p99_ms, p99_ms):
+                    stable += 1
+                else:
+                    stable = 0
+                self.p99_ms = p99_ms
+                self.elapsed_secs = round(time.monotonic() - started, 3)
+                logger.info(f"Warm-up round {self.rounds}: p99 ms {p99_ms}")
+
+                if stable >= self.stable_rounds:
+                    self.settled = True
+                    break
+                if self.elapsed_secs >= self.timeout_secs:
+                    break
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error(f"Warm-up failed: {e}")
+            return
+
+        if not self.settled:
+            logger.warning(f"Warm-up latency did not settle after {self.rounds} rounds; reporting ready anyway")
+        if on_ready is not None:
+            on_ready()
+        self.state = "ready"
+        logger.info(f"Warm-up finished in {self.elapsed_secs}s after {self.rounds} rounds")
+
+    async def _run_round(self, paths: Dict[str, WarmupPath]) -> Dict[str, float]:
+        """Time calls_per_round calls of every (path, batch size) case."""
+        p99_ms = {}
+        for name, (score, max_size) in paths.items():
+            for size in self.batch_sizes:
+                if max_size is not None and size > max_size:
+                    continue
+                durations = []
+                for _ in range(self.calls_per_round):
+                    # Fresh customers every call, so the prediction cache never answers
+                    self._seed += 1
+                    customers = generate_customers(size, seed=self._seed)
+                    durations.append(await self._timed(score, customers))
+                p99_ms[f"{name}:{size}"] = round(float(np.percentile(durations, 99)) * 1000, 3)
+        return p99_ms
+
+    @staticmethod
+    async def _timed(score: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+                     customers: List[Dict[str, Any]]) -> float:
+        """Duration of one scoring call; waits out pool saturation from early real traffic."""
+        while True:
+            start = time.perf_counter()
+            try:
+                await score(customers)
+                return time.perf_counter() - start
+            except PoolSaturatedError as e:
+                await asyncio.sleep(e.retry_after)
+
+    def _within_tolerance(self, previous: Dict[str, float], current: Dict[str, float]) -> bool:
+        """True when no case's p99 moved by more than p99_tolerance since the previous round."""
+        return all(
+            abs(current[case] - previous[case]) <= max(self.p99_tolerance * previous[case], P99_NOISE_FLOOR_MS)
+            for case in current if case in previous
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Readiness state and the latest per-case p99 latencies."""
+        return {
+            "status": self.state,
+            "rounds": self.rounds,
+            "settled": self.settled,
+            "elapsed_secs": self.elapsed_secs,
+            "p99_ms": self.p99_ms,
+            "error": self.error
+        }
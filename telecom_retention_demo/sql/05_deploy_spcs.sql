@@ -82,7 +82,7 @@ spec:
         memory: 2Gi
         cpu: 1
     readinessProbe:
-      path: /health
+      path: /ready
       port: 8000
   endpoints:
   - name: predict